@@ -9,7 +9,53 @@ class Settings(BaseSettings):
     DB_NAME: str
     DB_USER: str
     DB_PASSWORD: str
+    DB_ECHO: bool = False  # log every SQL statement; very slow for bulk loads
     ECFR_BASE_URL: str = "https://www.ecfr.gov/api"
+    ECFR_TIMEOUT_SEC: float = 900  # the full-title endpoint can take minutes for large titles
+    ECFR_MAX_CONNECTIONS: int = 10
+    ECFR_MAX_KEEPALIVE_CONNECTIONS: int = 5
+    ECFR_KEEPALIVE_EXPIRY_SEC: float = 60
+    ECFR_HTTP2: bool = False  # requires the optional h2 package
+    POOL_METRICS_INTERVAL_SEC: float = 60  # how often workers log HTTP pool metrics; 0 disables
+    DELTA_FETCH_ENABLED: bool = False  # derive versions from the previous one plus re-fetched changed parts
+    DELTA_MAX_PARTS: int = 20  # above this many changed parts a full download is cheaper
+    XML_STREAM_CHUNK_SIZE: int = 64 * 1024  # bytes read per chunk when streaming full titles
+    XML_SPOOL_MAX_SIZE: int = 8 * 1024 * 1024  # spooled downloads spill to disk past this size
+    XML_CACHE_DIR: str = ""  # directory for the compressed full-title XML cache; empty disables it
+    XML_CACHE_MAX_BYTES: int = 5 * 1024 * 1024 * 1024
+    BULK_UPSERT_BATCH_SIZE: int = 1000  # rows per multi-row INSERT ... ON CONFLICT statement
+    FETCHER_SYNC_MODE: str = "full"  # "full" re-crawls everything, "incremental" syncs only changed titles
+    FETCHER_CONCURRENCY: int = 8  # concurrent title-version requests during a metadata sync; 1 keeps it sequential
+    ECFR_RATE_LIMIT_PER_SEC: float = 4.0  # ceiling for the adaptive eCFR request rate
+    ECFR_TARGET_LATENCY_SEC: float = 5.0  # responses slower than this make the rate limiter back off
+    CPU_WORKERS: int = 0  # processes parsing and counting XML; 0 uses every CPU the pod's quota allows
+    PIPELINE_QUEUE_SIZE: int = 2  # jobs buffered between the fetch, count and save stages
+    DIVISION_COUNT_LEAF_TYPES: str = "part"  # store own-text counts for every division down to these types (comma-separated, at or below "part" for delta fetching); empty counts only mapped divisions
+    WORD_COUNT_BACKEND: str = "counter"  # "counter" or "numpy" (per-process vocabulary ids + bincount; needs numpy installed)
+    XML_PARSER_ENGINE: str = "etree"  # "etree", "lxml" (needs lxml installed) or "expat"; all produce the same counts
+    XML_USE_MMAP: bool = False  # memory-map downloaded/cached XML files instead of reading them through a buffer
+    JOB_LEASE_SEC: int = 600  # a PROCESSING job whose lease was not renewed for this long is returned to PENDING
+    JOB_HEARTBEAT_SEC: int = 60  # how often a worker renews the leases on its jobs; well below JOB_LEASE_SEC
+    JOB_REAPER_INTERVAL_SEC: int = 60  # how often each worker looks for expired leases; 0 disables the reaper
+    JOB_MAX_ATTEMPTS: int = 5  # attempts (including expired leases) before a failing job is marked DEAD
+    JOB_RETRY_BASE_SEC: float = 30  # backoff before the first retry; doubles with every further attempt
+    JOB_RETRY_MAX_SEC: float = 3600  # longest backoff between attempts
+    POD_MEMORY_LIMIT_BYTES: int = 1024 * 1024 * 1024  # pod memory limit assumed when the cgroup sets none
+    WORKER_MEMORY_BUDGET_BYTES: int = 0  # memory running jobs may reserve at once; 0 uses WORKER_MEMORY_BUDGET_FRACTION of the pod limit
+    WORKER_MEMORY_BUDGET_FRACTION: float = 0.75  # the rest is headroom for the interpreter, caches and counting processes
+    DIVISION_CACHE_MEMORY_FRACTION: float = 0.05  # share of the pod's memory all counting processes' division count caches may use together; taken out of the job memory budget
+    JOB_MEMORY_BASE_BYTES: int = 32 * 1024 * 1024  # estimated memory of a job besides its XML
+    JOB_MEMORY_PER_XML_BYTE: float = 1.5  # estimated memory per byte of a title's XML (spooled download plus counts)
+    JOB_DEFAULT_XML_BYTES: int = 32 * 1024 * 1024  # XML size assumed for a title never downloaded and not sized by HEAD
+    JOB_SIZE_HEAD_REQUEST: bool = False  # size unseen titles with a HEAD request before admitting them; off by default, as the eCFR API renders the whole title to answer it
+    JOB_SIZE_CLASS_MEDIUM_BYTES: int = 16 * 1024 * 1024  # titles with at least this much XML are 'medium'
+    JOB_SIZE_CLASS_LARGE_BYTES: int = 64 * 1024 * 1024  # titles with at least this much XML are 'large'
+    WORKER_SIZE_CLASSES: str = ""  # comma-separated job size classes this worker claims (e.g. "large" for a high-memory pool); empty claims all
+    ENQUEUE_TITLES: str = ""  # comma-separated title numbers to enqueue jobs for; empty enqueues every title referenced by an agency
+    ENQUEUE_PRIORITY: int = 0  # priority of the enqueued jobs (higher is claimed first); also raised on their existing PENDING jobs
+    JOB_NOTIFY_CHANNEL: str = "version_processing_jobs"  # Postgres channel NOTIFYed when jobs become pending; empty disables LISTEN (e.g. behind a transaction-mode pooler)
+    JOB_POLL_FALLBACK_SEC: float = 30  # idle workers listening for NOTIFYs still poll this often in case one was missed
+    JOB_POLL_INTERVAL_SEC: float = 2  # idle poll interval while not listening
     
     class Config:
         env_file = ".env"
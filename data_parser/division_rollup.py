@@ -0,0 +1,50 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from part_delta import matched_divisions
+
+
+def division_path(ancestry: List[List[str]]) -> str:
+    """The key a division's row is stored under: its ancestry as 'type:N/type:N/...'."""
+    return "/".join(f"{type_c}:{n_value}" for type_c, n_value in ancestry)
+
+
+def rollup_division_counts(divisions: Iterable[Tuple[List[List[str]], dict]],
+                           path: Dict[str, Optional[list]]) -> Dict[str, Dict[str, dict]]:
+    """
+    Derives division totals from per-division own word counts: every division tracked in the
+    path map receives the counts of every row at or below it.
+
+    Args:
+        divisions: (ancestry, own word_statistics) rows, as stored in version_division_word_counts.
+        path: {type: [codes]} to total; None totals every division of that type.
+
+    Returns:
+        {type: {code: word_statistics}}, with an entry (possibly empty) for every tracked division present.
+    """
+    totals = {type_c: {} for type_c in path}
+    for ancestry, word_statistics, *_ in divisions:
+        for type_c, n_value in matched_divisions(ancestry, path):
+            totals[type_c].setdefault(n_value, Counter()).update(word_statistics or {})
+    return {type_c: {code: dict(counter) for code, counter in codes.items()} for type_c, codes in totals.items()}
+
+
+def rollup_agency_counts(divisions: Iterable[Tuple[List[List[str]], dict]],
+                         agency_paths: Dict[str, Dict[str, list]]) -> Dict[str, dict]:
+    """
+    Derives each agency's total for a title from per-division own word counts. A row is counted
+    once per agency even if the agency is mapped to several divisions above it (say, a chapter
+    and one of its parts).
+
+    Args:
+        agency_paths: {agency: {type: [codes]}} of the agency's divisions in this title.
+
+    Returns:
+        {agency: word_statistics}
+    """
+    totals = {agency: Counter() for agency in agency_paths}
+    for ancestry, word_statistics, *_ in divisions:
+        for agency, path in agency_paths.items():
+            if next(matched_divisions(ancestry, path), None) is not None:
+                totals[agency].update(word_statistics or {})
+    return {agency: dict(counter) for agency, counter in totals.items()}
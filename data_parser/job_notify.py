@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.base import settings
+
+
+async def notify_pending_jobs(session: AsyncSession, count: int = 1):
+    """
+    Tells listening workers that jobs became pending. The notification is delivered when the
+    session's transaction commits, so it never arrives before the jobs are visible. Does
+    nothing when JOB_NOTIFY_CHANNEL is empty (notifications disabled).
+    """
+    if not settings.JOB_NOTIFY_CHANNEL:
+        return
+    await session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                          {"channel": settings.JOB_NOTIFY_CHANNEL, "payload": str(count)})
+
+
+class JobWakeup:
+    """
+    Wakes idle job claimers as soon as jobs are enqueued, using a LISTEN connection on
+    JOB_NOTIFY_CHANNEL. Polling remains as a fallback: every JOB_POLL_FALLBACK_SEC while
+    listening, in case a notification is missed, and every JOB_POLL_INTERVAL_SEC while the
+    listen connection is down (or when no dsn is given).
+
+    Claimers read `generation` before claiming and pass it to wait(), so a notification that
+    arrives between an empty claim and the wait is not lost.
+    """
+
+    def __init__(self, dsn: Optional[str] = None, channel: str = None):
+        self.dsn = dsn
+        self.channel = channel or settings.JOB_NOTIFY_CHANNEL
+        self.listening = False
+        self.generation = 0
+        self._event = asyncio.Event()
+
+    def wake(self):
+        self.generation += 1
+        self._event.set()
+        self._event = asyncio.Event()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.wake()
+
+    async def wait(self, seen_generation: int):
+        """Returns once woken after seen_generation, or after the poll interval."""
+        if self.generation != seen_generation:
+            return
+        timeout = settings.JOB_POLL_FALLBACK_SEC if self.listening else settings.JOB_POLL_INTERVAL_SEC
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        """Keeps a LISTEN connection open, reconnecting when it is lost. Runs until cancelled."""
+        if self.dsn is None:
+            return
+        import asyncpg
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+            except (OSError, asyncpg.PostgresError) as e:
+                logging.warning(f"Could not open the job notification connection: {e}; polling meanwhile")
+                await asyncio.sleep(settings.JOB_POLL_FALLBACK_SEC)
+                continue
+            try:
+                await connection.add_listener(self.channel, self._on_notify)
+                self.listening = True
+                self.wake() # Jobs may have been enqueued while we were not listening
+                logging.info(f"Listening for new jobs on channel {self.channel}.")
+                while True:
+                    await asyncio.sleep(settings.JOB_POLL_FALLBACK_SEC)
+                    await connection.execute("SELECT 1") # Detects a dropped connection
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logging.warning(f"Job notification connection lost: {e}; reconnecting")
+            finally:
+                self.listening = False
+                if not connection.is_closed():
+                    connection.terminate()
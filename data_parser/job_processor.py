@@ -1,22 +1,40 @@
+import argparse
 import asyncio
 import logging
-from typing import List
+import httpx
+import math
+import multiprocessing
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
 import os
 import json
 import cProfile
 import pstats # For analyzing profile output
 import io # For capturing profile output to string
 import traceback
+from collections import Counter
+from datetime import date, timedelta
 
-from sqlalchemy import select, update, func, text
+from sqlalchemy import select, update, delete, func, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from uuid import uuid4
 
 from ecfr_fetcher.fetcher import ECFRFetcher
-from models.models import VersionProcessingJobs, VersionWordCounts
-from content_parser import TextProcessor
+from ecfr_fetcher.xml_cache import XMLCache
+from models.models import Agency, TitleProcessingStats, VersionProcessingJobs, VersionWordCounts, VersionPartWordCounts, VersionDivisionWordCounts, TitleVersion
+from content_parser import TextProcessor, count_divisions_in_file, count_division_own_words_in_file
+from part_delta import apply_part_deltas
+from division_rollup import division_path, rollup_agency_counts, rollup_division_counts
+from transformation_store import save_word_transformations
+from memory_budget import MemoryBudget
+from job_notify import JobWakeup
+from retry_policy import PERMANENT, classify_error, retry_delay
 from config.base import settings 
 from db.db import get_db
 
@@ -29,50 +47,189 @@ db_url = f"postgresql+asyncpg://{os.environ.get('DB_USER')}:{os.environ.get('DB_
 engine = create_async_engine(db_url)  # Create engine once per ECS task
 async_session_factory = async_sessionmaker(engine, expire_on_commit=False) # Create session factory once per ECS task
 
+DIGEST_LOOKUP_BATCH_SIZE = 5000 # Digests per IN (...) lookup, well below asyncpg's bind parameter limit
+
+
+def create_fetcher() -> ECFRFetcher:
+    """
+    Creates the long-lived fetcher shared by every processor in this worker process,
+    with its connection pool sized from config and the XML cache enabled if configured.
+    """
+    xml_cache = XMLCache(settings.XML_CACHE_DIR, settings.XML_CACHE_MAX_BYTES) if settings.XML_CACHE_DIR else None
+    return ECFRFetcher(settings.ECFR_BASE_URL, cache=xml_cache)
+
+
+def create_cpu_pool() -> ProcessPoolExecutor:
+    """
+    Creates the counting process pool. Its processes start from a forkserver, not a fork of
+    this process, so they inherit neither the event loop, the engine's connections nor the
+    fetcher's sockets, and a pool replaced mid-run starts from the same clean state.
+    """
+    return ProcessPoolExecutor(max_workers=cpu_worker_count(), mp_context=multiprocessing.get_context("forkserver"))
+
+
+def division_leaf_types() -> set:
+    """The DIVISION_COUNT_LEAF_TYPES setting as a set of lowercased division types; empty disables division rows."""
+    return {type_c.strip().lower() for type_c in settings.DIVISION_COUNT_LEAF_TYPES.split(',') if type_c.strip()}
+
+
+def load_title_path_map() -> dict:
+    """Reads title_path_map.json: {title number (as a string): {type: [codes]}}."""
+    title_path_map_file = os.path.join(os.path.dirname(__file__), 'title_path_map.json')
+    with open(title_path_map_file, 'r') as file:
+        return json.load(file)
+
+
+def available_cpus() -> int:
+    """
+    Returns how many CPUs this pod can use: its cgroup v2 CPU quota rounded up, or the
+    machine's CPU count when no quota is set.
+    """
+    try:
+        with open('/sys/fs/cgroup/cpu.max', 'r') as file:
+            quota, period = file.read().split()
+        if quota != 'max':
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return os.cpu_count() or 1
+
+
+def worker_size_classes() -> List[str]:
+    """The WORKER_SIZE_CLASSES setting as a list; empty claims jobs of every size."""
+    return [size_class.strip().lower() for size_class in settings.WORKER_SIZE_CLASSES.split(',') if size_class.strip()]
+
+
+def available_memory() -> int:
+    """
+    Returns the pod's memory limit in bytes from its cgroup v2 memory.max, or
+    POD_MEMORY_LIMIT_BYTES when no limit is set.
+    """
+    try:
+        with open('/sys/fs/cgroup/memory.max', 'r') as file:
+            limit = file.read().strip()
+        if limit != 'max':
+            return int(limit)
+    except (OSError, ValueError):
+        pass
+    return settings.POD_MEMORY_LIMIT_BYTES
+
+
+def cpu_worker_count() -> int:
+    """The number of counting processes: CPU_WORKERS, or one per available CPU."""
+    return settings.CPU_WORKERS or available_cpus()
+
+
+def division_cache_bytes() -> int:
+    """
+    The memory limit of each counting process's division count cache: DIVISION_CACHE_MEMORY_FRACTION
+    of the pod's limit, split between the processes since each keeps its own cache. 0 when
+    division rows are not counted.
+    """
+    if not division_leaf_types():
+        return 0
+    return int(available_memory() * settings.DIVISION_CACHE_MEMORY_FRACTION) // cpu_worker_count()
+
+
+def worker_memory_budget() -> int:
+    """
+    The memory jobs may reserve at once: WORKER_MEMORY_BUDGET_BYTES, or a share of the pod's limit,
+    less what the counting processes' division count caches may hold.
+    """
+    budget = settings.WORKER_MEMORY_BUDGET_BYTES or int(available_memory() * settings.WORKER_MEMORY_BUDGET_FRACTION)
+    return max(settings.JOB_MEMORY_BASE_BYTES, budget - division_cache_bytes() * cpu_worker_count())
+
 
 class JobProcessor:
-    def __init__(self, session_factory: async_sessionmaker): # Accept session_factory
+    def __init__(self, session_factory: async_sessionmaker, fetcher: ECFRFetcher, cpu_pool: Optional[Executor] = None,
+                 wakeup: Optional[JobWakeup] = None): # Accept session_factory
         self.async_session_factory = session_factory # Use the passed session factory
-        title_path_map_file = os.path.join(os.path.dirname(__file__), 'title_path_map.json')
-        with open(title_path_map_file, 'r') as file:
-            self.title_path_map = json.load(file)
-        self.processor = TextProcessor()
+        self.fetcher = fetcher # Shared per worker process; owned and closed by the caller
+        self.cpu_pool = cpu_pool # Parsing and counting run here when set, otherwise inline on the event loop
+        self.wakeup = wakeup or JobWakeup() # Idle claimers wait here for new jobs; polls only without a LISTEN connection
+        self.leaf_types = division_leaf_types()
+        self.lock_id = uuid4() # Identifies this processor's claims in version_processing_jobs.lock_id
+        self.leased_job_ids = set() # Claimed jobs whose attempt has not ended yet; their leases are renewed
+        self.memory_budget = MemoryBudget(worker_memory_budget()) # Admits jobs by estimated memory
+        self.division_cache_bytes = division_cache_bytes() # Per counting process, outside the memory budget
+        self.xml_sizes = {} # title_number -> size in bytes of its last full download
+        self.size_classes = worker_size_classes() # Job size classes this worker claims; empty claims all
+        self.title_path_map = load_title_path_map()
+        self.processor = TextProcessor(count_backend=settings.WORD_COUNT_BACKEND, parser_engine=settings.XML_PARSER_ENGINE)
 
 
     async def fetch_jobs(self, batch_size: int = 10) -> List[VersionProcessingJobs]:
         """
-        Fetches a batch of 'PENDING' jobs from the version_processing_jobs table using SELECT FOR UPDATE SKIP LOCKED.
-        This ensures that jobs are locked for processing by a single processor and skipped if already locked.
+        Claims a batch of 'PENDING' jobs in a single statement: the inner SELECT ... FOR UPDATE
+        SKIP LOCKED picks jobs no other processor is claiming, and the UPDATE marks them
+        'PROCESSING' under this processor's lock_id and returns them. Concurrent processors
+        therefore never claim the same job, and the claim costs one round trip.
+
+        Jobs are claimed by priority, then longest expected processing time first, so a backfill's
+        giant titles start early instead of stretching its tail; titles not yet sized come
+        before the sized ones of equal priority so they get sized early. Ties go title by title,
+        oldest version first: every version of a title shares its expected duration (and, when
+        enqueued together, its created_at), and the delta path and the division count cache
+        both work from the previous version's stored counts. With WORKER_SIZE_CLASSES
+        set, only jobs of those size classes (and jobs of titles not yet sized) are claimed; a job
+        enqueued before its title was sized is classed, and gets its payload_bytes, from the
+        title's title_processing_stats row as it is claimed. The claim is a
+        lease: run_lease_heartbeat renews it until the job's status is updated, and
+        reap_expired_leases hands it back to 'PENDING' if this processor dies first.
 
         Returns:
-            A list of VersionProcessingJobs objects that are fetched and locked for processing.
+            A list of VersionProcessingJobs objects that were claimed for processing.
             Returns an empty list if no jobs are available.
         """
         async with self.async_session_factory() as session:
             try:
-                # Using a raw SQL text query for 'FOR UPDATE SKIP LOCKED' for clarity and specific feature
-                stmt = text("""
-                    SELECT *
-                    FROM version_processing_jobs
-                    WHERE status = 'ABC'
-                    ORDER BY created_at
-                    LIMIT :batch_size
-                """).bindparams(batch_size=batch_size)
+                # Jobs enqueued before their title was sized take the class of the title's stats; '' matches unsized titles
+                size_filter = """
+                    AND COALESCE(size_class, (
+                        SELECT CASE
+                                   WHEN stats.payload_bytes >= :large_bytes THEN 'large'
+                                   WHEN stats.payload_bytes >= :medium_bytes THEN 'medium'
+                                   ELSE 'small'
+                               END
+                        FROM title_processing_stats AS stats
+                        WHERE stats.title_number = pending.title_number AND stats.payload_bytes IS NOT NULL
+                    ), '') = ANY(:size_classes)
+                """ if self.size_classes else ""
+                stmt = text(f"""
+                    UPDATE version_processing_jobs
+                    SET status = 'PROCESSING',
+                        lock_id = :lock_id,
+                        lock_acquired_at = now(),
+                        last_attempt_at = now(),
+                        updated_at = now(),
+                        payload_bytes = COALESCE(payload_bytes, (
+                            SELECT stats.payload_bytes FROM title_processing_stats AS stats
+                            WHERE stats.title_number = version_processing_jobs.title_number
+                        ))
+                    WHERE id IN (
+                        SELECT id
+                        FROM version_processing_jobs AS pending
+                        WHERE status = 'PENDING' AND (next_attempt_at IS NULL OR next_attempt_at <= now()) {size_filter}
+                        ORDER BY priority DESC, expected_duration_sec DESC, title_number, version_date
+                        LIMIT :batch_size
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING *
+                """).bindparams(lock_id=self.lock_id, batch_size=batch_size)
+                if self.size_classes:
+                    stmt = stmt.bindparams(size_classes=self.size_classes + [''], large_bytes=settings.JOB_SIZE_CLASS_LARGE_BYTES,
+                                           medium_bytes=settings.JOB_SIZE_CLASS_MEDIUM_BYTES)
 
                 result = await session.execute(stmt)
-
                 jobs = [VersionProcessingJobs(**dict(row)) for row in result.mappings()]
+                await session.commit()
 
+                self.leased_job_ids.update(job.id for job in jobs)
                 if jobs:
-                    job_ids = [job.id for job in jobs]
-                    logging.info(f"Fetched and locked {len(jobs)} jobs with IDs: {job_ids}")
-                    # Update status to PROCESSING immediately after fetching and locking
-                    await self._mark_jobs_processing(session, job_ids)
-                    await session.commit() # Commit transaction to hold locks and update statuses
-                    return jobs
+                    logging.info(f"Claimed {len(jobs)} jobs with IDs: {[job.id for job in jobs]}")
                 else:
                     logging.debug("No pending jobs found.")
-                    return [] # No jobs found
+                return jobs
 
             except SQLAlchemyError as e:
                 logging.error(f"Database error fetching jobs: {e}")
@@ -83,73 +240,578 @@ class JobProcessor:
                 await session.rollback()
                 return []
 
-
-    async def _mark_jobs_processing(self, session: AsyncSession, job_ids: List[int]):
+    async def prepare_job(self, job: VersionProcessingJobs) -> Optional[dict]:
         """
-        Marks the fetched jobs as 'PROCESSING' in the database.
-        This is an internal method called immediately after fetching and locking jobs.
+        Fetch stage: decides between delta and full processing and downloads the XML to be
+        counted into files, so the count stage can hand it to another process by path.
+
+        Returns:
+            A work dict (job, plan, files: {part or None: (path, is_temporary)}), or None if the job failed.
         """
+        job_id = job.id
+        print(f"Starting processing job ID: {job_id}, Title: {job.title_number}, Version Date: {job.version_date}")
+        logging.info(f"Starting processing job ID: {job_id}, Title: {job.title_number}, Version Date: {job.version_date}")
+        work = {"job": job, "plan": None, "files": {}, "known_divisions": None, "division_cache_hit_rate": None,
+                "busy_sec": 0.0}
         try:
-            stmt = update(VersionProcessingJobs).where(VersionProcessingJobs.id.in_(job_ids)).values(
-                status='PROCESSING',
-                attempt_count=VersionProcessingJobs.attempt_count + 1,
-                lock_id=uuid4(), # Assign a lock_id to track which processor is working on it
-                lock_acquired_at=func.now()
-            )
-            await session.execute(stmt)
-            logging.debug(f"Marked jobs {job_ids} as PROCESSING.")
-        except SQLAlchemyError as e:
-            logging.error(f"Error marking jobs as PROCESSING in database: {e}")
-            raise # Re-raise to be handled in fetch_jobs or process_job
+            logging.info(f"Job ID: {job_id} picked up.")
+            if settings.DELTA_FETCH_ENABLED:
+                async with self.async_session_factory() as session:
+                    work["plan"] = await self._plan_part_delta(session, job)
+            if work["plan"] is not None:
+                logging.info(f"Job ID: {job_id} counting {len(work['plan']['changed_parts'])} changed parts against {work['plan']['previous_date']}")
+                for part in sorted(work["plan"]["changed_parts"]):
+                    work["files"][part] = await self._download_to_path(job.title_number, job.version_date, part)
+            else:
+                if self.leaf_types:
+                    async with self.async_session_factory() as session:
+                        work["known_divisions"] = await self._load_known_division_digests(session, job)
+                work["files"][None] = await self._download_to_path(job.title_number, job.version_date)
+                if work["files"][None] is None:
+                    raise ValueError(f"Title {job.title_number} not found for version date {job.version_date}")
+            return work
+        except Exception as e:
+            await self._fail_job(work, e)
+            return None
 
+    async def count_job(self, work: dict) -> bool:
+        """
+        CPU stage: parses the downloaded XML and counts words, in the process pool when there
+        is one. Downloaded temporary files are removed afterwards.
 
-    async def process_job(self, job: VersionProcessingJobs):
+        Returns:
+            True if the counts were stored in the work dict, False if the job failed.
         """
-        Processes a single job. This is where your main job logic should reside.
-        This example simulates job processing and updates job status to 'COMPLETED' or 'FAILED'.
+        started = time.monotonic()
+        try:
+            if work["plan"] is not None:
+                work["word_counts"], work["part_counts"], work["division_counts"] = await self._count_words_delta(work)
+            else:
+                work["word_counts"], work["part_counts"], work["division_counts"] = await self._count_words_full(work)
+            return True
+        except Exception as e:
+            await self._fail_job(work, e)
+            return False
+        finally:
+            self._remove_files(work)
+            work["busy_sec"] += time.monotonic() - started # Queue and memory budget waits are not the job's duration
 
-        Args:
-            job: The VersionProcessingJobs object to be processed.
+    async def save_job(self, work: dict):
+        """
+        Save stage: stores the counts and marks the job 'COMPLETED' in one transaction, so a job
+        whose lease was lost (reaped and possibly claimed again) or whose save fails midway
+        leaves no rows behind to be counted a second time by the next attempt.
         """
+        job = work["job"]
         job_id = job.id
-        print(f"Starting processing job ID: {job_id}, Title: {job.title_number}, Version Date: {job.version_date}")
-        logging.info(f"Starting processing job ID: {job_id}, Title: {job.title_number}, Version Date: {job.version_date}")
+        started = time.monotonic()
         async with self.async_session_factory() as session:
-            # async with session.begin(): # Use begin() for transaction management
             try:
-                logging.info(f"Job ID: {job_id} picked up.")
-                fetcher = ECFRFetcher(settings.ECFR_BASE_URL)
-                xml_resp = await fetcher.fetch_full_title(job.title_number, job.version_date)
-                self.processor.set_xml_content(xml_resp)
-                title_number = str(job.title_number)
-                word_count_paragraphs = {key: {} for key in self.title_path_map[title_number]}
-                if title_number in self.title_path_map:
-                    extracted_text_paragraphs = await self.processor.extract_content_from_xml(self.title_path_map[title_number])
-                    for type, value in extracted_text_paragraphs.items():
-                        for code, text in value.items():
-                            word_counts = await self.processor.aggregate_word_counts_stemming_numeric_filter(text)
-                            word_count_paragraphs[type][code] = word_counts
-                            
-                    logging.info(f"Title: {title_number}, Word Counts complete!")#: {word_count_paragraphs}")
-                else:
-                    logging.warning(f"Title number {title_number} not found in title_path_map.")
-
                 # Save the word count results to the database or any other storage
-                await self._save_word_counts(session, job.title_number, job_id, job.version_date, word_count_paragraphs)
-                await self._update_job_status(session, job_id, 'COMPLETED')
+                await self._save_word_counts(session, job.title_number, job_id, job.version_date, work["word_counts"])
+                if work["part_counts"] is not None and work["plan"] is None:
+                    # A full run sees every part; mark those it no longer has so later deltas don't count them
+                    work["part_counts"].update(await self._removed_parts(session, job.title_number, job.version_date, work["part_counts"]))
+                if work["part_counts"]:
+                    await self._save_part_counts(session, job.title_number, job.version_date, work["part_counts"])
+                if work["division_counts"]:
+                    await self._save_division_counts(session, job.title_number, job_id, job.version_date, work["division_counts"])
+                duration = work["busy_sec"] + time.monotonic() - started # Counting and saving only
+                payload_bytes = self.xml_sizes.get(job.title_number)
+                if not await self._update_job_status(session, job_id, 'COMPLETED', division_cache_hit_rate=work["division_cache_hit_rate"],
+                                                     duration_sec=duration, payload_bytes=payload_bytes):
+                    await session.rollback() # Another processor holds the job now; its attempt stores the counts
+                    return
                 await session.commit()
                 logging.info(f"Job ID: {job_id} processed and marked COMPLETED successfully.") # Log AFTER successful completion
+                if work["plan"] is None:
+                    # Delta runs only fetch changed parts, so only full runs tell how long the title takes
+                    await self._record_title_size(session, job.title_number, payload_bytes, duration)
+                await self._flush_word_transformations(session)
 
             except Exception as e:
-                traceback.print_exc()
-                logging.error(f"Error processing job ID: {job_id}: {e}")
-                await self._update_job_status(session, job_id, 'FAILED', str(e)) # Update status to FAILED in DB
-                await session.rollback() # Rollback transaction on error during processing! 
+                await session.rollback() # Rollback transaction on error during processing!
                 logging.warning(f"Transaction rolled back for job ID {job_id} due to error: {e}")
+                await self._fail_job(work, e)
+
+    async def _fail_job(self, work: dict, error: Exception):
+        """
+        Ends a failed attempt: transient errors send the job back to 'PENDING' with an
+        exponentially backed-off next_attempt_at, while permanent errors, and jobs out of
+        attempts (JOB_MAX_ATTEMPTS), are marked 'DEAD'. The last error is kept either way.
+        """
+        traceback.print_exc()
+        job = work["job"]
+        job_id = job.id
+        self._remove_files(work)
+        attempts = (job.attempt_count or 0) + 1
+        error_message = f"{type(error).__name__}: {error}"[:500]
+        kind = classify_error(error)
+        if isinstance(error, BrokenProcessPool):
+            # Every job counting in the pool fails when one counting process dies (e.g. OOM-killed)
+            # and there is no telling which one caused it, so each of them uses up an attempt: a
+            # title that kills its process every time ends up DEAD instead of breaking the pool forever
+            logging.warning(f"Counting process pool broke during job ID: {job_id}.")
+        if kind == PERMANENT or attempts >= settings.JOB_MAX_ATTEMPTS:
+            status, delay = 'DEAD', None
+            logging.error(f"Error processing job ID: {job_id} ({kind}, attempt {attempts}); marking it DEAD: {error}")
+        else:
+            status, delay = 'PENDING', retry_delay(attempts)
+            logging.warning(f"Error processing job ID: {job_id} ({kind}, attempt {attempts}); retrying in {delay:.0f}s: {error}")
+        try:
+            await self._update_job_status(None, job_id, status, error_message, retry_delay_sec=delay)
+        except SQLAlchemyError:
+            pass # Already logged; the job stays PROCESSING until its lease expires and it is reaped
+
+    async def estimate_job_memory(self, job: VersionProcessingJobs) -> int:
+        """
+        Estimates the memory a job needs from the size of its title's XML: the size of a past
+        download of the title in this worker, its payload_bytes, or its size in the XML cache,
+        otherwise JOB_DEFAULT_XML_BYTES (or, with JOB_SIZE_HEAD_REQUEST, the Content-Length of
+        a HEAD request first). A failing lookup only costs the estimate its accuracy, never the
+        claimed job.
+        """
+        size = self.xml_sizes.get(job.title_number) or getattr(job, 'payload_bytes', None)
+        if size is None and self.fetcher.cache is not None:
+            try:
+                size = await asyncio.to_thread(self.fetcher.cache.raw_size, job.title_number, job.version_date)
+            except Exception as e:
+                logging.warning(f"Could not read the cached size of title {job.title_number}: {e}")
+        if size is None and settings.JOB_SIZE_HEAD_REQUEST:
+            try:
+                size = await self.fetcher.full_title_size(job.title_number, job.version_date)
+            except httpx.HTTPError as e:
+                logging.debug(f"HEAD request for title {job.title_number} failed: {e}")
+            except Exception as e:
+                logging.warning(f"HEAD request for title {job.title_number} failed: {e}")
+        if size is None:
+            size = settings.JOB_DEFAULT_XML_BYTES
+        else:
+            self.xml_sizes[job.title_number] = size
+        return settings.JOB_MEMORY_BASE_BYTES + int(size * settings.JOB_MEMORY_PER_XML_BYTE)
+
+    async def _download_to_path(self, title_number: int, version_date, part: str = None):
+        """
+        Downloads a title (or one of its parts) and returns (path, is_temporary) for a file a
+        worker process can open, or None on 404. Cached full titles are used in place from the
+        XML cache; anything else is streamed straight into a temporary file that the caller removes.
+        """
+        if part is None and self.fetcher.cache is not None:
+            cached_path = await asyncio.to_thread(self.fetcher.cache.get_path, title_number, version_date)
+            if cached_path is not None:
+                self.xml_sizes[title_number] = await asyncio.to_thread(self.fetcher.cache.raw_size, title_number, version_date)
+                return cached_path, False
+        temporary = tempfile.NamedTemporaryFile(prefix=f"title-{title_number}-", suffix=".xml", delete=False)
+        try:
+            with temporary:
+                found = await self.fetcher.download_full_title(title_number, version_date, part=part, target=temporary)
+        except BaseException:
+            os.remove(temporary.name)
+            raise
+        if found is None:
+            os.remove(temporary.name)
+            return None
+        if part is None:
+            self.xml_sizes[title_number] = os.path.getsize(temporary.name)
+        return temporary.name, True
+
+    @staticmethod
+    def _remove_files(work: dict):
+        for downloaded in work["files"].values():
+            if downloaded is not None and downloaded[1] and os.path.exists(downloaded[0]):
+                os.remove(downloaded[0])
+        work["files"] = {}
+
+    async def _run_counter(self, counter, *args) -> list:
+        """
+        Runs a counting task (count_divisions_in_file or count_division_own_words_in_file) in the
+        process pool, or inline without one, and queues the word transformations it recorded
+        for the next flush.
+        """
+        options = (settings.WORD_COUNT_BACKEND, settings.XML_PARSER_ENGINE, settings.XML_USE_MMAP)
+        if self.cpu_pool is None:
+            divisions, transformations = counter(*args, *options)
+        else:
+            cpu_pool = self.cpu_pool
+            try:
+                divisions, transformations = await asyncio.get_running_loop().run_in_executor(cpu_pool, counter, *args, *options)
+            except BrokenProcessPool:
+                self._replace_broken_pool(cpu_pool)
+                raise
+        self.processor.normalizer.queue_transformations(transformations)
+        return divisions
+
+    def _replace_broken_pool(self, broken_pool: Executor):
+        """
+        Swaps in a fresh process pool once a counting process has died (e.g. OOM-killed): a
+        ProcessPoolExecutor stays broken after that and would fail every later job. Every task
+        that was running in the broken pool gets here; only the first replaces it.
+        """
+        if self.cpu_pool is not broken_pool:
+            return
+        logging.warning("A counting process died; replacing the process pool.")
+        self.cpu_pool = create_cpu_pool()
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _count_divisions(self, xml_path: str, count_path: dict) -> list:
+        return await self._run_counter(count_divisions_in_file, xml_path, count_path)
+
+    async def _count_division_rows(self, xml_path: str, title_number: int = None, known_divisions: tuple = None):
+        """
+        Counts every division's own words down to the leaf types, reusing the counts of
+        divisions whose text hashes to a known digest: one in the counting process's cache, or
+        one of known_divisions, (version_date, digests) of the title's earlier version, whose
+        counts are then read back from its stored rows.
+
+        Returns:
+            [(ancestry, word_statistics, digest, reused)], where reused tells whether the counts came from the cache.
+        """
+        previous_date, known_digests = known_divisions or (None, None)
+        divisions = await self._run_counter(count_division_own_words_in_file, xml_path, self.leaf_types, known_digests,
+                                            self.division_cache_bytes)
+        rows = [(ancestry, word_counts, digest, reused) for _, _, ancestry, word_counts, digest, reused in divisions]
+        missing = {digest for _, word_counts, digest, _ in rows if word_counts is None}
+        if not missing:
+            return rows
+        async with self.async_session_factory() as session:
+            stored = await self._load_division_counts(session, title_number, previous_date, missing)
+        if len(stored) < len(missing):
+            raise RuntimeError(f"Division rows of title {title_number} as of {previous_date} changed while counting")
+        return [(ancestry, stored[digest] if word_counts is None else word_counts, digest, reused)
+                for ancestry, word_counts, digest, reused in rows]
+
+    @staticmethod
+    def _cache_hit_rate(division_counts: list) -> Optional[float]:
+        return sum(1 for row in division_counts if row[3]) / len(division_counts) if division_counts else None
+
+    async def _load_known_division_digests(self, session: AsyncSession, job: VersionProcessingJobs) -> Optional[tuple]:
+        """
+        Returns (version_date, {digest}) of the division rows stored for the title's latest
+        earlier version, the persisted side of the division count cache, or None if there is none.
+        Only the digests are loaded; the counts of the divisions that turn out unchanged are read
+        once they are known (see _load_division_counts).
+        """
+        previous_date = (await session.execute(
+            select(func.max(VersionDivisionWordCounts.version_date)).where(
+                VersionDivisionWordCounts.title_number == job.title_number,
+                VersionDivisionWordCounts.version_date < job.version_date
+            )
+        )).scalar()
+        if previous_date is None:
+            return None
+        result = await session.execute(
+            select(VersionDivisionWordCounts.content_digest).where(
+                VersionDivisionWordCounts.title_number == job.title_number,
+                VersionDivisionWordCounts.version_date == previous_date,
+                VersionDivisionWordCounts.content_digest.isnot(None)
+            )
+        )
+        return previous_date, set(result.scalars())
+
+    @staticmethod
+    async def _load_division_counts(session: AsyncSession, title_number: int, version_date, digests: set) -> dict:
+        """Returns {digest: word_statistics} of the given digests among the title version's division rows."""
+        counts = {}
+        digests = list(digests)
+        for start in range(0, len(digests), DIGEST_LOOKUP_BATCH_SIZE):
+            result = await session.execute(
+                select(VersionDivisionWordCounts.content_digest, VersionDivisionWordCounts.word_statistics).where(
+                    VersionDivisionWordCounts.title_number == title_number,
+                    VersionDivisionWordCounts.version_date == version_date,
+                    VersionDivisionWordCounts.content_digest.in_(digests[start:start + DIGEST_LOOKUP_BATCH_SIZE])
+                )
+            )
+            counts.update(result.all())
+        return counts
+
+    @staticmethod
+    def _part_counts_from_rows(division_counts: list, parts=None) -> dict:
+        """Sums division rows into {part: {"ancestry", "word_statistics"}} for the given parts, or all of them."""
+        totals = rollup_division_counts(division_counts, {'part': parts})['part']
+        ancestries = {ancestry[-1][1]: ancestry for ancestry, *_ in division_counts if ancestry[-1][0] == 'part'}
+        return {part: {"ancestry": ancestries[part], "word_statistics": counts} for part, counts in totals.items()}
+
+    async def _count_words_full(self, work: dict):
+        """
+        Counts words for the divisions in the title path map in the downloaded title.
+        With delta fetching enabled, also counts every part so later versions can be derived from them.
+
+        With DIVISION_COUNT_LEAF_TYPES set, every division's own words are counted instead, and the
+        mapped divisions' and parts' totals are summed from those rows.
+
+        Returns:
+            A tuple of ({type: {code: word_statistics}}, per-part counts or None, division rows or None).
+        """
+        job = work["job"]
+        title_number = str(job.title_number)
+        path = {key: set(values) for key, values in self.title_path_map.get(title_number, {}).items()}
+        word_count_paragraphs = {key: {} for key in path}
+        if not path:
+            logging.warning(f"Title number {title_number} not found in title_path_map.")
+
+        if self.leaf_types:
+            division_counts = await self._count_division_rows(work["files"][None][0], job.title_number, work["known_divisions"])
+            work["division_cache_hit_rate"] = self._cache_hit_rate(division_counts)
+            word_count_paragraphs.update(rollup_division_counts(division_counts, path))
+            part_counts = self._part_counts_from_rows(division_counts) if settings.DELTA_FETCH_ENABLED else None
+            logging.info(f"Title: {title_number}, Word Counts complete for {len(division_counts)} divisions, hit rate {work['division_cache_hit_rate']}!")
+            return word_count_paragraphs, part_counts, division_counts
+
+        # One pass counts the mapped divisions and, for delta fetching, every part
+        count_path = dict(path)
+        part_counts = None
+        if settings.DELTA_FETCH_ENABLED:
+            count_path['part'] = None
+            part_counts = {}
+        if count_path:
+            for type, code, ancestry, word_counts in await self._count_divisions(work["files"][None][0], count_path):
+                if code in path.get(type, ()):
+                    word_count_paragraphs[type][code] = word_counts
+                if part_counts is not None and type == 'part':
+                    part_counts[code] = {"ancestry": ancestry, "word_statistics": word_counts}
+            logging.info(f"Title: {title_number}, Word Counts complete!")#: {word_count_paragraphs}")
+        return word_count_paragraphs, part_counts, None
+
+    async def _plan_part_delta(self, session: AsyncSession, job: VersionProcessingJobs):
+        """
+        Decides whether a job can be derived from the previous version of its title plus the
+        parts amended on its version date, instead of downloading and recounting the whole title.
+
+        That is possible when the title_versions rows for the date name few enough parts
+        (DELTA_MAX_PARTS), the previous version's job is COMPLETED and stored per-part counts,
+        and stored per-part counts exist for each changed part as of the previous version.
+
+        Returns:
+            A plan dict (changed_parts, previous_date, previous_counts, old_parts), or None to process in full.
+        """
+        result = await session.execute(
+            select(TitleVersion.part).where(
+                TitleVersion.title_number == job.title_number,
+                TitleVersion.version_date == job.version_date
+            )
+        )
+        changed_parts = {row[0] for row in result}
+        if not changed_parts or None in changed_parts or len(changed_parts) > settings.DELTA_MAX_PARTS:
+            return None
+
+        previous_date = (await session.execute(
+            select(func.max(TitleVersion.version_date)).where(
+                TitleVersion.title_number == job.title_number,
+                TitleVersion.version_date < job.version_date
+            )
+        )).scalar()
+        if previous_date is None:
+            return None
+        previous_status = (await session.execute(
+            select(VersionProcessingJobs.status).where(
+                VersionProcessingJobs.title_number == job.title_number,
+                VersionProcessingJobs.version_date == previous_date
+            )
+        )).scalar()
+        if previous_status != 'COMPLETED':
+            return None
+        previous_has_parts = (await session.execute(
+            select(VersionPartWordCounts.id).where(
+                VersionPartWordCounts.title_number == job.title_number,
+                VersionPartWordCounts.version_date == previous_date
+            ).limit(1)
+        )).first()
+        if previous_has_parts is None:
+            return None # Processed without part counts, so parts it removed are unknown; fall back to a full run
+
+        old_parts = {}
+        for part in changed_parts:
+            row = (await session.execute(
+                select(VersionPartWordCounts).where(
+                    VersionPartWordCounts.title_number == job.title_number,
+                    VersionPartWordCounts.part == part,
+                    VersionPartWordCounts.version_date <= previous_date
+                ).order_by(VersionPartWordCounts.version_date.desc()).limit(1)
+            )).scalar_one_or_none()
+            if row is None:
+                return None # No baseline for this part (new, or never counted); fall back to a full run
+            old_parts[part] = {
+                "ancestry": row.ancestry,
+                "word_statistics": {} if row.removed else row.word_statistics
+            }
+
+        result = await session.execute(
+            select(VersionWordCounts.type, VersionWordCounts.code, VersionWordCounts.word_statistics).where(
+                VersionWordCounts.title_number == job.title_number,
+                VersionWordCounts.version_date == previous_date
+            )
+        )
+        previous_counts = {}
+        for type, code, word_statistics in result:
+            previous_counts.setdefault(type, {})[code] = word_statistics
+
+        previous_divisions = None
+        if self.leaf_types:
+            result = await session.execute(
+                select(VersionDivisionWordCounts.ancestry, VersionDivisionWordCounts.word_statistics,
+                       VersionDivisionWordCounts.content_digest).where(
+                    VersionDivisionWordCounts.title_number == job.title_number,
+                    VersionDivisionWordCounts.version_date == previous_date
+                )
+            )
+            previous_divisions = [tuple(row) for row in result]
+            if not previous_divisions:
+                return None # Division rows must carry over from the previous version
+
+        return {
+            "changed_parts": changed_parts,
+            "previous_date": previous_date,
+            "previous_counts": previous_counts,
+            "old_parts": old_parts,
+            "previous_divisions": previous_divisions
+        }
+
+    async def _count_words_delta(self, work: dict):
+        """
+        Counts the downloaded changed parts of the title and applies their count differences to
+        the previous version's division counts. Parts that 404 or are absent from the response are removed.
+
+        With division rows, the changed parts' rows replace the previous version's rows at and
+        below those parts, and the parts' totals are summed from them.
+
+        Returns:
+            A tuple of ({type: {code: word_statistics}}, {part: counts or None when removed}, division rows or None).
+        """
+        job, plan = work["job"], work["plan"]
+        new_parts = {}
+        new_divisions = []
+        for part in sorted(plan["changed_parts"]):
+            downloaded = work["files"].get(part)
+            counted = None
+            if downloaded is not None and self.leaf_types:
+                part_rows = []
+                for ancestry, word_counts, digest, reused in await self._count_division_rows(downloaded[0]):
+                    if ['part', part] in ancestry:
+                        # Rebase on the known ancestry, which a part-filtered response may only partly include
+                        below_part = ancestry[ancestry.index(['part', part]) + 1:]
+                        part_rows.append((plan["old_parts"][part]["ancestry"] + below_part, word_counts, digest, reused))
+                if part_rows:
+                    new_divisions.extend(part_rows)
+                    part_counts = self._part_counts_from_rows(part_rows, {part})[part]
+                    counted = (part_counts["ancestry"], part_counts["word_statistics"])
+            elif downloaded is not None:
+                for _, _, ancestry, word_counts in await self._count_divisions(downloaded[0], {'part': {part}}):
+                    counted = (ancestry, word_counts)
+            if counted is None:
+                new_parts[part] = None
+                continue
+            # A part-filtered response may omit the enclosing divisions; keep the known ancestry then
+            ancestry = counted[0] if len(counted[0]) > 1 else plan["old_parts"][part]["ancestry"]
+            new_parts[part] = {"ancestry": ancestry, "word_statistics": counted[1]}
+
+        path = self.title_path_map.get(str(job.title_number), {})
+        word_counts = apply_part_deltas(plan["previous_counts"], path, plan["old_parts"], new_parts)
+        for part, counts in new_parts.items():
+            if counts is None:
+                new_parts[part] = {"ancestry": plan["old_parts"][part]["ancestry"], "word_statistics": {}, "removed": True}
+
+        division_counts = None
+        if plan["previous_divisions"] is not None:
+            changed = [['part', part] for part in plan["changed_parts"]]
+            division_counts = [
+                row for row in plan["previous_divisions"]
+                if not any(division in row[0] for division in changed)
+            ] + new_divisions
+            work["division_cache_hit_rate"] = self._cache_hit_rate(new_divisions)
+        return word_counts, new_parts, division_counts
+
+    async def _save_part_counts(self, session: AsyncSession, title: int, version_date, part_counts: dict):
+        """
+        Upserts per-part word counts for a version, so retried jobs overwrite their earlier rows.
+        """
+        rows = [
+            {
+                "title_number": title,
+                "part": part,
+                "version_date": version_date,
+                "ancestry": counts["ancestry"],
+                "word_statistics": counts["word_statistics"],
+                "removed": counts.get("removed", False)
+            }
+            for part, counts in part_counts.items()
+        ]
+        try:
+            for start in range(0, len(rows), settings.BULK_UPSERT_BATCH_SIZE):
+                stmt = pg_insert(VersionPartWordCounts.__table__).values(rows[start:start + settings.BULK_UPSERT_BATCH_SIZE])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["title_number", "part", "version_date"],
+                    set_={column: stmt.excluded[column] for column in ("ancestry", "word_statistics", "removed")}
+                )
+                await session.execute(stmt)
+            logging.debug(f"Saved {len(rows)} part counts for title: {title}, version_date: {version_date}.")
+        except SQLAlchemyError as e:
+            logging.error(f"Database error saving part counts for title: {title}, version_date: {version_date}: {e}")
+            raise
+
+    @staticmethod
+    async def _removed_parts(session: AsyncSession, title: int, version_date, present_parts) -> dict:
+        """
+        Returns "removed" part counts for the parts that existed as of the title's previous
+        version but are not among present_parts. Without these rows, a later delta would take
+        a removed part's last stored counts as its baseline and subtract words no longer there.
+        """
+        latest = (
+            select(VersionPartWordCounts.part, VersionPartWordCounts.ancestry, VersionPartWordCounts.removed)
+            .where(VersionPartWordCounts.title_number == title, VersionPartWordCounts.version_date < version_date)
+            .distinct(VersionPartWordCounts.part)
+            .order_by(VersionPartWordCounts.part, VersionPartWordCounts.version_date.desc())
+        )
+        return {
+            part: {"ancestry": ancestry, "word_statistics": {}, "removed": True}
+            for part, ancestry, removed in await session.execute(latest)
+            if not removed and part not in present_parts
+        }
+
+    async def _save_division_counts(self, session: AsyncSession, title: int, job_id: int, version_date, division_counts: list):
+        """
+        Upserts a version's per-division own word counts, from which any division's or agency's
+        totals can be re-derived (see division_rollup.py) without reprocessing the version.
+        Sibling divisions with the same type and N share a row, which then has no content digest.
+        """
+        merged = {}
+        for ancestry, word_counts, digest, *_ in division_counts:
+            key = division_path(ancestry)
+            if key in merged:
+                merged[key][1].update(word_counts)
+                merged[key][2] = None
+            else:
+                merged[key] = [ancestry, Counter(word_counts), digest]
+        rows = [
+            {
+                "title_number": title,
+                "task_id": job_id,
+                "version_date": version_date,
+                "division_path": key,
+                "type": ancestry[-1][0],
+                "code": ancestry[-1][1],
+                "ancestry": ancestry,
+                "word_statistics": dict(word_counts),
+                "content_digest": digest
+            }
+            for key, (ancestry, word_counts, digest) in merged.items()
+        ]
+        try:
+            for start in range(0, len(rows), settings.BULK_UPSERT_BATCH_SIZE):
+                stmt = pg_insert(VersionDivisionWordCounts.__table__).values(rows[start:start + settings.BULK_UPSERT_BATCH_SIZE])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["title_number", "version_date", "division_path"],
+                    set_={column: stmt.excluded[column] for column in ("task_id", "ancestry", "word_statistics", "content_digest")}
+                )
+                await session.execute(stmt)
+            logging.debug(f"Saved {len(rows)} division counts for title: {title}, version_date: {version_date}.")
+        except SQLAlchemyError as e:
+            logging.error(f"Database error saving division counts for title: {title}, version_date: {version_date}: {e}")
+            raise
 
     async def _save_word_counts(self, session: AsyncSession, title: int, job_id: int, version_date: str, word_counts: dict):
         """
-        Saves the word count results to the database or any other storage.
+        Saves the word count results to the database or any other storage. Nothing is committed;
+        save_job commits them together with the job's other counts and its status.
 
         Args:
             session: The database session.
@@ -172,66 +834,355 @@ class JobProcessor:
                     session.add(word_count_entry)
 
             await session.flush()  # Flush to ensure all records are staged
-            await session.commit()
             # print(f"Saved word counts for title: {title}, version_date: {version_date}, type: {type}, code: {code}.")
             logging.debug(f"Saved word counts for title: {title}, version_date: {version_date}, type: {type}, code: {code}.")
         except SQLAlchemyError as e:
             logging.error(f"Database error saving word counts for title: {title}, version_date: {version_date}, type: {type}, code: {code} : {e}")
-            await session.rollback()
             raise
     
-    async def _update_job_status(self, session: AsyncSession, job_id: int, status: str, error_message: str = None):
-        async with self.async_session_factory() as new_session: #trying new session for status update
+    async def _flush_word_transformations(self, session: AsyncSession):
+        """
+        Persists the word transformations recorded since the last flush by any processor in this
+        worker process. A failed flush is logged and retried after the next job rather than
+        failing the job that triggered it.
+        """
+        pairs = self.processor.normalizer.drain_new_transformations()
+        if not pairs:
+            return
+        try:
+            await save_word_transformations(session, pairs)
+        except SQLAlchemyError as e:
+            logging.error(f"Database error flushing {len(pairs)} word transformations: {e}")
+            await session.rollback()
+            self.processor.normalizer.queue_transformations(pairs)
+
+    async def _update_job_status(self, session: Optional[AsyncSession], job_id: int, status: str, error_message: str = None,
+                                 division_cache_hit_rate: float = None, duration_sec: float = None, payload_bytes: int = None,
+                                 retry_delay_sec: float = None) -> bool:
+        """
+        Ends this processor's attempt at a job: sets its status, counts the attempt and releases
+        the lease. With retry_delay_sec, the job may not be claimed again before that many
+        seconds. Given a session, the update is left for the caller to commit together with its
+        other writes; without one it is committed on its own.
+
+        Returns:
+            False if the lease was lost, i.e. the job was reaped and may already be claimed by
+            another processor; nothing is updated then.
+        """
+        self.leased_job_ids.discard(job_id)
+        stmt = update(VersionProcessingJobs).where(
+            VersionProcessingJobs.id == job_id,
+            VersionProcessingJobs.lock_id == self.lock_id,
+        ).values(
+            status=status,
+            error_message=error_message,
+            attempt_count=func.coalesce(VersionProcessingJobs.attempt_count, 0) + 1,
+            last_attempt_at=func.now(),
+            updated_at=func.now(),
+            lock_id=None,
+            lock_acquired_at=None,
+            next_attempt_at=func.now() + timedelta(seconds=retry_delay_sec) if retry_delay_sec is not None else None,
+            division_cache_hit_rate=division_cache_hit_rate,
+            duration_sec=duration_sec,
+            payload_bytes=func.coalesce(payload_bytes, VersionProcessingJobs.payload_bytes)
+        )
+        if session is not None:
+            result = await session.execute(stmt)
+        else:
+            async with self.async_session_factory() as new_session:
+                try:
+                    result = await new_session.execute(stmt)
+                    await new_session.commit()
+                except SQLAlchemyError as e:
+                    logging.error(f"Database error updating job status for ID {job_id}: {e}")
+                    await new_session.rollback()
+                    raise
+        if result.rowcount == 0:
+            logging.warning(f"Lease on job ID: {job_id} was lost; not marking it {status}.")
+            return False
+        logging.debug(f"Updated job ID: {job_id} status to {status}.")
+        return True
+
+    async def _record_title_size(self, session: AsyncSession, title_number: int, payload_bytes: Optional[int], duration_sec: float):
+        """
+        Records a title's XML size and processing time in its title_processing_stats row, once per
+        title. Jobs enqueued from then on start with the title's size class and expected duration
+        (see job_queue.py); pending jobs are classed from the row as they are claimed.
+        """
+        try:
+            stmt = pg_insert(TitleProcessingStats.__table__).values(
+                title_number=title_number, payload_bytes=payload_bytes, duration_sec=duration_sec
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["title_number"],
+                set_={
+                    "payload_bytes": func.coalesce(stmt.excluded.payload_bytes, TitleProcessingStats.__table__.c.payload_bytes),
+                    "duration_sec": stmt.excluded.duration_sec,
+                    "updated_at": func.now(),
+                }
+            )
+            await session.execute(stmt)
+            await session.commit()
+        except SQLAlchemyError as e:
+            logging.error(f"Database error recording the size of title {title_number}: {e}")
+            await session.rollback()
+
+    async def renew_leases(self) -> int:
+        """
+        Heartbeat: moves lock_acquired_at to now for every job this processor holds, including
+        jobs waiting in the pipeline queues. Jobs whose lease was already reaped are dropped
+        from the leased set.
+
+        Returns:
+            The number of leases renewed.
+        """
+        job_ids = list(self.leased_job_ids)
+        if not job_ids:
+            return 0
+        async with self.async_session_factory() as session:
             try:
-                stmt = update(VersionProcessingJobs).where(VersionProcessingJobs.id == job_id).values(
-                    status=status,
-                    error_message=error_message,
-                    last_attempt_at=func.now(),
-                    updated_at=func.now(),
-                    lock_id=None,
-                    lock_acquired_at=None
-                )
-                await new_session.execute(stmt)
-                await new_session.commit()
-                logging.debug(f"Updated job ID: {job_id} status to {status}.")
+                stmt = update(VersionProcessingJobs).where(
+                    VersionProcessingJobs.id.in_(job_ids),
+                    VersionProcessingJobs.lock_id == self.lock_id,
+                    VersionProcessingJobs.status == 'PROCESSING',
+                ).values(lock_acquired_at=func.now()).returning(VersionProcessingJobs.id)
+                renewed = set((await session.execute(stmt)).scalars())
+                await session.commit()
             except SQLAlchemyError as e:
-                logging.error(f"Database error updating job status for ID {job_id}: {e}")
-                await new_session.rollback()
-                raise
-        
+                logging.error(f"Database error renewing leases on jobs {job_ids}: {e}")
+                await session.rollback()
+                return 0
+        lost = set(job_ids) - renewed
+        if lost:
+            logging.warning(f"Leases on job IDs {sorted(lost)} expired before they were renewed.")
+            self.leased_job_ids -= lost
+        return len(renewed)
+
+    async def reap_expired_leases(self) -> int:
+        """
+        Returns 'PROCESSING' jobs whose lease has not been renewed for JOB_LEASE_SEC (their
+        processor crashed or was OOM-killed) to 'PENDING', counting the lost attempt and backing
+        off like a transient failure; jobs out of attempts are marked 'DEAD'. Safe to run from
+        every worker at once: each expired job is reaped by exactly one of them.
+
+        Returns:
+            The number of jobs reaped.
+        """
+        async with self.async_session_factory() as session:
+            try:
+                stmt = text("""
+                    UPDATE version_processing_jobs
+                    SET status = CASE WHEN COALESCE(attempt_count, 0) + 1 >= :max_attempts THEN 'DEAD' ELSE 'PENDING' END,
+                        attempt_count = COALESCE(attempt_count, 0) + 1,
+                        error_message = 'Lease expired',
+                        next_attempt_at = now() + make_interval(secs => (0.5 + random() / 2)
+                            * LEAST(CAST(:retry_max_sec AS float8), :retry_base_sec * power(2, COALESCE(attempt_count, 0)))),
+                        lock_id = NULL,
+                        lock_acquired_at = NULL,
+                        updated_at = now()
+                    WHERE status = 'PROCESSING'
+                      AND (lock_acquired_at IS NULL OR lock_acquired_at < now() - make_interval(secs => :lease_sec))
+                    RETURNING id, status
+                """).bindparams(lease_sec=settings.JOB_LEASE_SEC, max_attempts=settings.JOB_MAX_ATTEMPTS,
+                                retry_base_sec=float(settings.JOB_RETRY_BASE_SEC), retry_max_sec=float(settings.JOB_RETRY_MAX_SEC))
+                reaped = (await session.execute(stmt)).all()
+                await session.commit()
+            except SQLAlchemyError as e:
+                logging.error(f"Database error reaping expired job leases: {e}")
+                await session.rollback()
+                return 0
+        if reaped:
+            dead = [job_id for job_id, status in reaped if status == 'DEAD']
+            logging.warning(f"Reaped {len(reaped)} jobs with expired leases: {[job_id for job_id, _ in reaped]}"
+                            + (f"; out of attempts and marked DEAD: {dead}" if dead else ""))
+        return len(reaped)
+
+    async def run_lease_heartbeat(self):
+        """Renews this processor's leases every JOB_HEARTBEAT_SEC."""
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_SEC)
+            await self.renew_leases()
+
+    async def run_lease_reaper(self):
+        """Reaps expired leases every JOB_REAPER_INTERVAL_SEC."""
+        while True:
+            await self.reap_expired_leases()
+            await asyncio.sleep(settings.JOB_REAPER_INTERVAL_SEC)
 
-    async def run_processor_loop(self):
+    async def run_pipeline(self, fetch_workers: int, cpu_workers: int):
         """
-        Main loop for the job processor. Fetches jobs and processes them continuously.
+        Runs jobs through the prepare, count and save stages concurrently, connected by queues
+        of PIPELINE_QUEUE_SIZE jobs: fetch_workers tasks claim jobs and download them,
+        cpu_workers tasks keep the process pool busy counting, and one task saves results.
+        A full queue holds back the stage feeding it, so downloads never run far ahead of counting.
+        A job reserves its estimated memory before it is downloaded and releases it once saved
+        or failed, so many small titles overlap while a giant title runs alone.
         """
-        logging.info(f"Job processor started.")
+        count_queue = asyncio.Queue(settings.PIPELINE_QUEUE_SIZE)
+        save_queue = asyncio.Queue(settings.PIPELINE_QUEUE_SIZE)
+        logging.info(f"Job pipeline started with {fetch_workers} fetch and {cpu_workers} count workers.")
+        stages = [self._fetch_stage(count_queue) for _ in range(fetch_workers)]
+        stages += [self._count_stage(count_queue, save_queue) for _ in range(cpu_workers)]
+        stages.append(self._save_stage(save_queue))
+        await asyncio.gather(*stages)
+
+    async def _fetch_stage(self, count_queue: asyncio.Queue):
+        while True:
+            generation = self.wakeup.generation
+            jobs = await self.fetch_jobs(1) # Claim one job at a time so claimed jobs are not left waiting in the queue
+            if not jobs:
+                await self.wakeup.wait(generation) # Wait for new jobs to be enqueued
+                continue
+            reserved = await self.memory_budget.reserve(await self.estimate_job_memory(jobs[0]))
+            work = await self.prepare_job(jobs[0])
+            if work is None:
+                self.memory_budget.release(reserved)
+                continue
+            work["reserved_memory"] = reserved
+            await count_queue.put(work)
+
+    async def _count_stage(self, count_queue: asyncio.Queue, save_queue: asyncio.Queue):
         while True:
-            jobs = await self.fetch_jobs(10) # Fetch a batch of jobs
-            if jobs:
-                for job in jobs:
-                    await self.process_job(job)
-                    await asyncio.sleep(0.3)
+            work = await count_queue.get()
+            if await self.count_job(work):
+                await save_queue.put(work)
             else:
-                await asyncio.sleep(2) # Wait for 2 seconds if no jobs are found
+                self.memory_budget.release(work["reserved_memory"])
+
+    async def _save_stage(self, save_queue: asyncio.Queue):
+        while True:
+            work = await save_queue.get()
+            try:
+                await self.save_job(work)
+            finally:
+                self.memory_budget.release(work["reserved_memory"])
+
+
+async def rebuild_word_counts(session: AsyncSession, title_number: int, path: dict) -> int:
+    """
+    Re-derives a title's version_word_counts for a new path map (e.g. after agencies are
+    re-mapped) by summing its stored division rows, for every version that has them. Nothing is
+    downloaded or parsed.
+
+    Returns:
+        The number of versions rebuilt.
+    """
+    result = await session.execute(
+        select(VersionDivisionWordCounts.version_date, VersionDivisionWordCounts.task_id,
+               VersionDivisionWordCounts.ancestry, VersionDivisionWordCounts.word_statistics).where(
+            VersionDivisionWordCounts.title_number == title_number
+        )
+    )
+    versions = {}
+    for version_date, task_id, ancestry, word_statistics in result:
+        versions.setdefault(version_date, (task_id, []))[1].append((ancestry, word_statistics))
+    if not versions:
+        return 0
+
+    await session.execute(delete(VersionWordCounts).where(
+        VersionWordCounts.title_number == title_number,
+        VersionWordCounts.version_date.in_(list(versions))
+    ))
+    for version_date, (task_id, division_counts) in versions.items():
+        for type, counts in rollup_division_counts(division_counts, path).items():
+            for code, word_statistics in counts.items():
+                session.add(VersionWordCounts(title_number=title_number, task_id=task_id, version_date=version_date,
+                                              type=type, code=code, word_statistics=word_statistics))
+    await session.commit()
+    logging.info(f"Rebuilt word counts for {len(versions)} versions of title {title_number} from division rows.")
+    return len(versions)
+
+
+async def agency_word_counts(session: AsyncSession, title_number: int, version_date) -> dict:
+    """
+    Sums a title version's stored division rows into each agency's word counts, using the
+    divisions listed in the agencies' docs. Nothing is downloaded or parsed.
+
+    Returns:
+        {agency slug: word_statistics} for the agencies with divisions in the title.
+    """
+    from title_map import prepare_title_path_maps # Imported here: it configures logging on import
+
+    agency_paths = {}
+    for slug, docs in await session.execute(select(Agency.slug, Agency.docs)):
+        path = prepare_title_path_maps(docs or []).get(title_number)
+        if path:
+            agency_paths[slug] = path
+    result = await session.execute(
+        select(VersionDivisionWordCounts.ancestry, VersionDivisionWordCounts.word_statistics).where(
+            VersionDivisionWordCounts.title_number == title_number,
+            VersionDivisionWordCounts.version_date == version_date
+        )
+    )
+    return rollup_agency_counts(result.all(), agency_paths)
+
+
+async def rebuild_from_division_rows(title_numbers: List[int]):
+    """Rebuilds version_word_counts of the given titles with the current title_path_map.json."""
+    title_path_map = load_title_path_map()
+    async with async_session_factory() as session:
+        for title_number in title_numbers:
+            path = title_path_map.get(str(title_number))
+            if not path:
+                logging.warning(f"Title number {title_number} not found in title_path_map; skipping it.")
+                continue
+            await rebuild_word_counts(session, title_number, path)
+
+
+async def log_pool_metrics(fetcher: ECFRFetcher, interval: float, memory_budget: MemoryBudget = None):
+    """Periodically logs the shared fetcher's connection pool metrics (and the memory budget's use)."""
+    while True:
+        await asyncio.sleep(interval)
+        logging.info(f"HTTP pool metrics: {fetcher.pool_stats()}")
+        if memory_budget is not None:
+            logging.info(f"Memory budget: {memory_budget.stats()}")
 
 
 async def run_multiple_processors(num_processors: int):
-    processors = [JobProcessor(async_session_factory) for _ in range(num_processors)] # Pass session_factory
-    tasks = [processor.run_processor_loop() for processor in processors]
-    logging.info(f"Running {num_processors} job processors.")
-    await asyncio.gather(*tasks)
+    """
+    Runs the job pipeline with num_processors concurrent fetch workers and one counting
+    process per available CPU (or CPU_WORKERS). Idle fetch workers are woken by NOTIFYs on
+    JOB_NOTIFY_CHANNEL.
+    """
+    cpu_workers = cpu_worker_count()
+    async with create_fetcher() as fetcher:
+        # A plain asyncpg connection (not from the engine's pool) LISTENs for new jobs
+        wakeup = JobWakeup(db_url.replace("postgresql+asyncpg://", "postgresql://", 1) if settings.JOB_NOTIFY_CHANNEL else None)
+        processor = JobProcessor(async_session_factory, fetcher, create_cpu_pool(), wakeup) # Pass session_factory
+        try:
+            tasks = [processor.run_pipeline(num_processors, cpu_workers), processor.run_lease_heartbeat(), wakeup.run()]
+            if settings.JOB_REAPER_INTERVAL_SEC > 0:
+                tasks.append(processor.run_lease_reaper())
+            if settings.POOL_METRICS_INTERVAL_SEC > 0:
+                tasks.append(log_pool_metrics(fetcher, settings.POOL_METRICS_INTERVAL_SEC, processor.memory_budget))
+            logging.info(f"Running {num_processors} job processors.")
+            await asyncio.gather(*tasks)
+        finally:
+            processor.cpu_pool.shutdown(cancel_futures=True) # The pool in use, which may have replaced a broken one
 
 async def main():
     """
-    Main function to start the job processors.
+    Main function to start the job processors, or to re-derive counts from stored division
+    rows (--rebuild, --agency-totals) and exit.
     """
+    parser = argparse.ArgumentParser(description="Process version jobs")
+    parser.add_argument("--rebuild", nargs="+", type=int, metavar="TITLE",
+                        help="rebuild version_word_counts of these titles from division rows with the current title_path_map.json")
+    parser.add_argument("--agency-totals", nargs=2, metavar=("TITLE", "VERSION_DATE"),
+                        help="print each agency's word counts for a title version, summed from division rows")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        await rebuild_from_division_rows(args.rebuild)
+        return
+    if args.agency_totals:
+        title_number, version_date = int(args.agency_totals[0]), date.fromisoformat(args.agency_totals[1])
+        async with async_session_factory() as session:
+            print(json.dumps(await agency_word_counts(session, title_number, version_date), indent=2))
+        return
+
     num_processors = 5 # Define number of parallel processors
     await run_multiple_processors(num_processors)
-    # processor = JobProcessor()
-    # jobs = await processor.fetch_jobs() # Fetch a batch of jobs
-    # if jobs:
-    #     for job in jobs:
-    #         await processor.process_job(job)
 
 if __name__ == "__main__":
     
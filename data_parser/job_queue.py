@@ -2,14 +2,14 @@
 import asyncio
 import logging
 from typing import List, Dict
-import json
-from sqlalchemy import select
+from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # from data_parser import models
 from db.db import get_db  # Correct import path
 from config.base import settings
 from models.models import *
+from job_notify import notify_pending_jobs
 
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -29,72 +29,68 @@ class DataProcessor:
             logging.error(f"Error fetching agencies: {e}")
             raise
 
-    async def create_processing_jobs_for_title_versions(self):
-        """Creates VersionProcessingJobs entries for each TitleVersion that doesn't already have one."""
+    async def create_processing_jobs_for_title_versions(self) -> int:
+        """
+        Creates a VersionProcessingJobs entry for every version of the titles referenced by the
+        agencies' docs (or of the ENQUEUE_TITLES among them) that doesn't already have one.
+
+        Everything happens in one INSERT ... SELECT ... ON CONFLICT DO NOTHING on the
+        unique_processing_task key, so enqueueing the whole corpus is a single statement and
+        re-running it is harmless. New jobs of titles processed before take their size and
+        processing time from title_processing_stats, so they are claimed in size-aware order
+        straight away.
+
+        Jobs get ENQUEUE_PRIORITY. A positive priority also raises the priority of the selected
+        titles' jobs that are still pending, so e.g. ENQUEUE_TITLES=40 ENQUEUE_PRIORITY=10 moves
+        title 40 to the front of the queue.
+
+        Returns:
+            The number of jobs created.
+        """
+        configured_titles = [int(title) for title in settings.ENQUEUE_TITLES.split(',') if title.strip()]
+        title_filter = "WHERE selected_titles.title_number = ANY(:titles)" if configured_titles else ""
+        priority = settings.ENQUEUE_PRIORITY
+        conflict_action = "DO NOTHING"
+        if priority > 0:
+            conflict_action = """DO UPDATE SET priority = EXCLUDED.priority
+                WHERE version_processing_jobs.status = 'PENDING' AND version_processing_jobs.priority < EXCLUDED.priority"""
+        stmt = text(f"""
+            WITH selected_titles AS (
+                SELECT DISTINCT (doc->>'title')::int AS title_number
+                FROM agencies CROSS JOIN LATERAL jsonb_array_elements(
+                    CASE WHEN jsonb_typeof(agencies.docs) = 'array' THEN agencies.docs END
+                ) AS doc
+                WHERE (doc->>'title') ~ '^[0-9]+$'
+            )
+            INSERT INTO version_processing_jobs (title_number, version_date, status, priority, payload_bytes, size_class, expected_duration_sec)
+            SELECT versions.title_number, versions.version_date, 'PENDING', :priority, stats.payload_bytes,
+                   CASE
+                       WHEN stats.payload_bytes >= :large_bytes THEN 'large'
+                       WHEN stats.payload_bytes >= :medium_bytes THEN 'medium'
+                       WHEN stats.payload_bytes IS NOT NULL THEN 'small'
+                   END,
+                   stats.duration_sec
+            FROM (
+                SELECT DISTINCT title_versions.title_number, title_versions.version_date
+                FROM title_versions JOIN selected_titles USING (title_number)
+                {title_filter}
+            ) AS versions
+            LEFT JOIN title_processing_stats AS stats USING (title_number)
+            ON CONFLICT ON CONSTRAINT unique_processing_task {conflict_action}
+            RETURNING id, (xmax = 0) AS created
+        """).bindparams(priority=priority, large_bytes=settings.JOB_SIZE_CLASS_LARGE_BYTES,
+                        medium_bytes=settings.JOB_SIZE_CLASS_MEDIUM_BYTES)
+        if configured_titles:
+            stmt = stmt.bindparams(titles=configured_titles)
         try:
-            # 1. Fetch all TitleVersions
-            agencies = await self.fetch_agencies()
-            # print('agencies')
-            # print(agencies)
-            titles_set = set()
-            for agency in agencies:
-                docs = agency.docs
-                logging.info(f"Agency: {agency.name}, Docs: {docs}")
-                try:
-                    docs_list = docs
-                    for doc in docs_list:
-                        # print('doc')
-                        # print(doc)
-                        title = doc.get("title")
-                        if title in { 7, 50 } : #12, 47, 49, 21, 48}: #7, 50 - lastly
-                            titles_set.add(title)
-                        chapter = doc.get("chapter")
-                        logging.info(f"Title: {title}, Chapter: {chapter}")
-                except json.JSONDecodeError as e:
-                    logging.error(f"Error decoding JSON for agency {agency.name}: {e}")
-
-            title_versions = []
-            for title in titles_set:
-                title_versions_query = await self.session.execute(
-                    select(TitleVersion).filter(TitleVersion.title_number == title).order_by(TitleVersion.version_date.desc())
-                )
-                title_versions_for_title = title_versions_query.scalars().all()
-                title_versions.extend(title_versions_for_title)
-                # title_version = await self.session.execute(
-                #     select(TitleVersion).filter(TitleVersion.title_number == title).order_by(TitleVersion.version_date.desc()).limit(1)
-                # )
-                # title_version = title_version.scalar_one_or_none()
-                # if title_version:
-                #     title_versions.append(title_version)
-            
-            jobs_created = 0
-            
-            for i, tv in enumerate(title_versions):
-                # 2. Check if a VersionProcessingJobs record already exists
-                existing_job = await self.session.execute(
-                    select(VersionProcessingJobs).filter_by(
-                        title_number=tv.title_number,
-                        version_date=tv.version_date
-                    )
-                )
-                existing_job = existing_job.scalar_one_or_none()
-
-                if not existing_job:
-                    # 3. Create a new VersionProcessingJobs if it doesn't exist
-                    new_job = VersionProcessingJobs(
-                        title_number=tv.title_number,
-                        version_date=tv.version_date
-                    )
-                    self.session.add(new_job)
-                    jobs_created += 1
-
-                # Commit every 100 records
-                if jobs_created % 100 == 0:
-                    await self.session.commit()
-
-            # Final commit for any remaining records
+            rows = (await self.session.execute(stmt)).all()
+            jobs_created = sum(1 for row in rows if row.created) # The others are pending jobs whose priority was raised
+            # Wake idle workers; the notification goes out with the commit
+            if rows:
+                await notify_pending_jobs(self.session, len(rows))
             await self.session.commit()
             logging.info(f"Created {jobs_created} VersionProcessingJobs entries.")
+            return jobs_created
 
         except Exception as e:
             logging.error(f"Error creating VersionProcessingJobs entries: {e}")
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from collections import deque
+
+
+class MemoryBudget:
+    """
+    Admits jobs against a fixed memory budget so a worker can run several at once without
+    exceeding its pod's memory limit. Each job reserves its estimated memory before it starts
+    and releases it when it is done.
+
+    Reservations are granted in arrival order: once a large job is waiting, smaller ones queue
+    behind it instead of overtaking it, so the large job is not starved and runs once enough
+    memory has been released. A reservation larger than the whole budget is clamped to it,
+    i.e. such a job runs alone.
+    """
+
+    def __init__(self, total_bytes: int):
+        self.total_bytes = total_bytes
+        self.in_use = 0
+        self._waiters = deque() # (bytes, future) in arrival order
+
+    async def reserve(self, nbytes: int) -> int:
+        """
+        Waits until nbytes (clamped to the budget) fits and reserves it.
+
+        Returns:
+            The number of bytes reserved, to be passed back to release().
+        """
+        nbytes = max(0, min(int(nbytes), self.total_bytes))
+        if not self._waiters and self.in_use + nbytes <= self.total_bytes:
+            self.in_use += nbytes
+            return nbytes
+
+        logging.info(f"Waiting for {nbytes / 2**20:.0f} MiB of memory budget "
+                     f"({self.in_use / 2**20:.0f} of {self.total_bytes / 2**20:.0f} MiB in use)")
+        waiter = (nbytes, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            if waiter[1].done() and not waiter[1].cancelled():
+                self.release(nbytes) # Granted just as we were cancelled
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+                self._grant() # We may have been holding up the queue
+            raise
+        return nbytes
+
+    def release(self, nbytes: int):
+        """Returns a reservation made with reserve() and admits the waiters that now fit."""
+        self.in_use -= nbytes
+        self._grant()
+
+    def _grant(self):
+        while self._waiters and self.in_use + self._waiters[0][0] <= self.total_bytes:
+            nbytes, future = self._waiters.popleft()
+            if not future.done():
+                self.in_use += nbytes
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        return {"total_bytes": self.total_bytes, "in_use_bytes": self.in_use, "waiting_jobs": len(self._waiters)}
@@ -0,0 +1,50 @@
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+def matched_divisions(ancestry: List[List[str]], path: Dict[str, Optional[list]]):
+    """
+    Yields the (type, N) pairs of an ancestry chain that are tracked in the title's path map.
+    A path value of None tracks every N of that type.
+    """
+    for type_c, n_value in ancestry or []:
+        if type_c in path and (path[type_c] is None or n_value in path[type_c]):
+            yield type_c, n_value
+
+
+def apply_part_deltas(previous_counts: Dict[str, Dict[str, dict]], path: Dict[str, list],
+                      old_parts: Dict[str, dict], new_parts: Dict[str, Optional[dict]]) -> Dict[str, Dict[str, dict]]:
+    """
+    Derives a version's division word counts from the previous version's counts and the
+    parts amended in between. Each changed part's old counts are subtracted from, and its new
+    counts added to, every tracked division in its ancestry; all other text is unchanged.
+
+    Args:
+        previous_counts: {type: {code: word_statistics}} of the previous version.
+        path: The title's path map, {type: [codes]}.
+        old_parts: {part: {"ancestry": [...], "word_statistics": {...}}} as of the previous version.
+        new_parts: The same for the new version; None for parts that no longer exist.
+
+    Returns:
+        {type: {code: word_statistics}} for the new version, keyed like the path map.
+    """
+    totals = {type_c: {} for type_c in path}
+    for type_c, codes in previous_counts.items():
+        if type_c not in totals:
+            continue
+        for code, word_statistics in codes.items():
+            totals[type_c][code] = Counter(word_statistics if isinstance(word_statistics, dict) else {})
+
+    for part in old_parts.values():
+        for type_c, n_value in matched_divisions(part["ancestry"], path):
+            totals[type_c].setdefault(n_value, Counter()).subtract(part["word_statistics"] or {})
+    for part in new_parts.values():
+        if part is None:
+            continue
+        for type_c, n_value in matched_divisions(part["ancestry"], path):
+            totals[type_c].setdefault(n_value, Counter()).update(part["word_statistics"] or {})
+
+    return {
+        type_c: {code: {word: count for word, count in counter.items() if count > 0} for code, counter in codes.items()}
+        for type_c, codes in totals.items()
+    }
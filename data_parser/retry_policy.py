@@ -0,0 +1,44 @@
+import asyncio
+import random
+from concurrent.futures.process import BrokenProcessPool
+
+import httpx
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from config.base import settings
+
+TRANSIENT, PERMANENT = "transient", "permanent"
+
+# XML parse errors of ElementTree, expat and lxml; matched by name so lxml need not be installed
+PARSE_ERROR_NAMES = {"ParseError", "ExpatError", "XMLSyntaxError"}
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Decides whether a job that failed with error is worth retrying. Timeouts, connection
+    problems, 5xx/429 responses, lost database connections and crashed counting processes are
+    transient; other 4xx responses (e.g. 404), XML parse errors and errors in the data (such
+    as a missing title) are permanent. Anything else is treated as transient and left to the
+    JOB_MAX_ATTEMPTS limit.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return TRANSIENT if status >= 500 or status in (408, 429) else PERMANENT
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError, TimeoutError, ConnectionError,
+                          BrokenProcessPool, MemoryError, OperationalError, InterfaceError)):
+        return TRANSIENT
+    if any(cls.__name__ in PARSE_ERROR_NAMES for cls in type(error).__mro__):
+        return PERMANENT
+    if isinstance(error, (ValueError, LookupError, TypeError, AttributeError)):
+        return PERMANENT
+    return TRANSIENT
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Seconds to wait before the next attempt after `attempts` failed ones: JOB_RETRY_BASE_SEC
+    doubled per attempt up to JOB_RETRY_MAX_SEC, with half of it jittered so jobs that failed
+    together (e.g. during an eCFR outage) do not all come back at once.
+    """
+    ceiling = min(settings.JOB_RETRY_MAX_SEC, settings.JOB_RETRY_BASE_SEC * 2 ** max(0, attempts - 1))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
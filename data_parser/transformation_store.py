@@ -0,0 +1,41 @@
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.base import settings
+from models.models import WordTransformation
+
+
+async def save_word_transformations(session: AsyncSession, pairs: Iterable[Tuple[str, str]]) -> int:
+    """
+    Appends (word, original) pairs to the word_transformations table. Pairs already stored,
+    including ones written concurrently by other workers, are skipped, so the table only ever
+    grows and needs no read-modify-write.
+
+    Returns:
+        The number of pairs sent.
+    """
+    rows = [{"word": word, "original": original} for word, original in pairs]
+    for start in range(0, len(rows), settings.BULK_UPSERT_BATCH_SIZE):
+        stmt = pg_insert(WordTransformation.__table__).values(rows[start:start + settings.BULK_UPSERT_BATCH_SIZE])
+        await session.execute(stmt.on_conflict_do_nothing(index_elements=["word", "original"]))
+    await session.commit()
+    logging.debug(f"Flushed {len(rows)} word transformations.")
+    return len(rows)
+
+
+async def load_word_transformation_map(session: AsyncSession) -> Dict[str, List[str]]:
+    """
+    Reads the word transformation map in the {word: [originals]} shape of the old
+    word_transformation_map.json, merging the rows of every worker.
+    """
+    result = await session.execute(
+        select(WordTransformation.word, WordTransformation.original).order_by(WordTransformation.word, WordTransformation.original)
+    )
+    word_transformation_map = {}
+    for word, original in result:
+        word_transformation_map.setdefault(word, []).append(original)
+    return word_transformation_map
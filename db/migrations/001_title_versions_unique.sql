@@ -0,0 +1,14 @@
+-- Upgrades an existing database to the unique title version key used by the bulk upserts.
+-- Fresh databases created from tables.sql already have it.
+
+-- Keep the earliest copy of rows duplicated by earlier non-idempotent re-runs
+DELETE FROM title_versions a
+    USING title_versions b
+    WHERE a.id > b.id
+      AND a.title_number = b.title_number
+      AND a.version_date = b.version_date
+      AND a.identifier = b.identifier;
+
+ALTER TABLE title_versions
+    ADD CONSTRAINT unique_title_version_identifier
+        UNIQUE(title_number, version_date, identifier);
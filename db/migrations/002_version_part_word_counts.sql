@@ -0,0 +1,13 @@
+-- Adds the per-part word count table used by delta processing to an existing database.
+
+CREATE TABLE IF NOT EXISTS version_part_word_counts (
+    id SERIAL PRIMARY KEY,
+    title_number INTEGER NOT NULL,
+    part VARCHAR(100) NOT NULL,
+    version_date DATE NOT NULL,
+    ancestry JSONB,
+    word_statistics JSONB,
+    removed BOOLEAN DEFAULT false,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_version_part_word_counts UNIQUE (title_number, part, version_date)
+);
@@ -0,0 +1,8 @@
+-- Adds the word transformation table that replaces word_transformation_map.json.
+
+CREATE TABLE IF NOT EXISTS word_transformations (
+    word TEXT NOT NULL,
+    original TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (word, original)
+);
@@ -0,0 +1,15 @@
+-- Adds the per-division own word count table used for roll-ups to an existing database.
+
+CREATE TABLE IF NOT EXISTS version_division_word_counts (
+    id SERIAL PRIMARY KEY,
+    task_id INTEGER REFERENCES version_processing_jobs(id),
+    title_number INTEGER NOT NULL,
+    version_date DATE NOT NULL,
+    division_path TEXT NOT NULL,
+    type VARCHAR(100),
+    code VARCHAR(100),
+    ancestry JSONB,
+    word_statistics JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_version_division_word_counts UNIQUE (title_number, version_date, division_path)
+);
@@ -0,0 +1,4 @@
+-- Adds division content digests and the per-job division cache hit rate to an existing database.
+
+ALTER TABLE version_division_word_counts ADD COLUMN IF NOT EXISTS content_digest VARCHAR(32);
+ALTER TABLE version_processing_jobs ADD COLUMN IF NOT EXISTS division_cache_hit_rate REAL;
@@ -0,0 +1,4 @@
+-- Adds the partial index used to claim pending processing jobs to an existing database.
+
+CREATE INDEX IF NOT EXISTS idx_version_processing_jobs_pending
+    ON version_processing_jobs(created_at) WHERE status = 'PENDING';
@@ -0,0 +1,4 @@
+-- Adds the partial index used by the job lease reaper to an existing database.
+
+CREATE INDEX IF NOT EXISTS idx_version_processing_jobs_leases
+    ON version_processing_jobs(lock_acquired_at) WHERE status = 'PROCESSING';
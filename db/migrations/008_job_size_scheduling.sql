@@ -0,0 +1,13 @@
+-- Adds job sizes, priorities and durations for size-aware claiming to an existing database.
+
+ALTER TABLE version_processing_jobs ADD COLUMN IF NOT EXISTS payload_bytes BIGINT;
+ALTER TABLE version_processing_jobs ADD COLUMN IF NOT EXISTS size_class VARCHAR(10);
+ALTER TABLE version_processing_jobs ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE version_processing_jobs ADD COLUMN IF NOT EXISTS expected_duration_sec REAL;
+ALTER TABLE version_processing_jobs ADD COLUMN IF NOT EXISTS duration_sec REAL;
+
+-- Claims are now ordered by priority and expected duration, then each title's versions oldest first
+DROP INDEX IF EXISTS idx_version_processing_jobs_pending;
+CREATE INDEX idx_version_processing_jobs_pending
+    ON version_processing_jobs(priority DESC, expected_duration_sec DESC, title_number, version_date) WHERE status = 'PENDING';
+
@@ -0,0 +1,26 @@
+-- Upgrades an existing database to the unique (title_number, version_date) job key that
+-- set-based enqueueing conflicts on. Fresh databases created from tables.sql already have it.
+
+-- Jobs duplicated by earlier enqueue runs: keep one copy per version, a completed one if any
+CREATE TEMPORARY TABLE duplicate_jobs AS
+SELECT id, first_value(id) OVER versions AS kept_id
+FROM version_processing_jobs
+WINDOW versions AS (PARTITION BY title_number, version_date ORDER BY (status = 'COMPLETED') DESC, id);
+
+DELETE FROM duplicate_jobs WHERE id = kept_id;
+
+UPDATE version_word_counts SET task_id = duplicate_jobs.kept_id
+    FROM duplicate_jobs WHERE version_word_counts.task_id = duplicate_jobs.id;
+UPDATE version_division_word_counts SET task_id = duplicate_jobs.kept_id
+    FROM duplicate_jobs WHERE version_division_word_counts.task_id = duplicate_jobs.id;
+DELETE FROM version_processing_jobs USING duplicate_jobs WHERE version_processing_jobs.id = duplicate_jobs.id;
+
+DROP TABLE duplicate_jobs;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_processing_task') THEN
+        ALTER TABLE version_processing_jobs
+            ADD CONSTRAINT unique_processing_task UNIQUE(title_number, version_date);
+    END IF;
+END $$;
@@ -0,0 +1,8 @@
+-- Adds retry scheduling to an existing database. Jobs left FAILED by the old code go back
+-- to PENDING and are retried under the retry policy (JOB_MAX_ATTEMPTS, backoff) from now on.
+
+ALTER TABLE version_processing_jobs ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP;
+
+UPDATE version_processing_jobs
+SET status = 'PENDING', next_attempt_at = NULL, updated_at = now()
+WHERE status = 'FAILED';
@@ -0,0 +1,16 @@
+-- Adds per-title size and duration stats to an existing database. They used to be copied onto
+-- every pending job of the title after each full run; now they are kept once per title.
+
+CREATE TABLE IF NOT EXISTS title_processing_stats (
+    title_number INTEGER PRIMARY KEY,
+    payload_bytes BIGINT,
+    duration_sec REAL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO title_processing_stats (title_number, payload_bytes, duration_sec)
+SELECT title_number, max(payload_bytes), max(duration_sec)
+FROM version_processing_jobs
+WHERE status = 'COMPLETED'
+GROUP BY title_number
+ON CONFLICT (title_number) DO NOTHING;
@@ -96,8 +96,9 @@ CREATE TABLE title_versions (
     removed BOOLEAN,
     subpart VARCHAR(100),
     type VARCHAR(100),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    -- UNIQUE(title_number, version_date, identifier)
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_title_version_identifier
+        UNIQUE(title_number, version_date, identifier)
 );
 
 -- Create indexes for common queries
@@ -114,18 +115,43 @@ CREATE TABLE version_processing_jobs (
     id SERIAL PRIMARY KEY,
     title_number INTEGER REFERENCES titles(number),
     version_date DATE NOT NULL,
-    status VARCHAR(20) NOT NULL DEFAULT 'PENDING', -- 'PENDING', 'PROCESSING', 'COMPLETED', 'FAILED'
+    status VARCHAR(20) NOT NULL DEFAULT 'PENDING', -- 'PENDING', 'PROCESSING', 'COMPLETED', 'DEAD'
     attempt_count INTEGER DEFAULT 0,
     last_attempt_at TIMESTAMP,
     error_message TEXT,
+    next_attempt_at TIMESTAMP, -- retries are not claimed before this
     lock_id UUID,
     lock_acquired_at TIMESTAMP,
+    division_cache_hit_rate REAL,
+    payload_bytes BIGINT,
+    size_class VARCHAR(10), -- 'small', 'medium', 'large'; NULL until the title is sized
+    priority INTEGER NOT NULL DEFAULT 0,
+    expected_duration_sec REAL,
+    duration_sec REAL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     CONSTRAINT unique_processing_task
         UNIQUE(title_number, version_date)
 );
 
+-- Pending jobs in claim order; partial, so it stays small as completed jobs accumulate
+CREATE INDEX idx_version_processing_jobs_pending
+    ON version_processing_jobs(priority DESC, expected_duration_sec DESC, title_number, version_date) WHERE status = 'PENDING';
+
+-- Leases of running jobs, scanned by the stale-lock reaper
+CREATE INDEX idx_version_processing_jobs_leases
+    ON version_processing_jobs(lock_acquired_at) WHERE status = 'PROCESSING';
+
+DROP TABLE IF EXISTS title_processing_stats CASCADE;
+
+-- One row per title: its XML size and processing time as of its latest full run
+CREATE TABLE title_processing_stats (
+    title_number INTEGER PRIMARY KEY,
+    payload_bytes BIGINT,
+    duration_sec REAL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 DROP TABLE IF EXISTS version_word_counts CASCADE;
 
 -- Table to store word count results
@@ -142,5 +168,50 @@ CREATE TABLE version_word_counts (
 );
 
 
+DROP TABLE IF EXISTS version_part_word_counts CASCADE;
+
+-- Per-part word counts, written only for the versions at which a part was (re)counted.
+-- The counts of a part at version V are in its latest row with version_date <= V.
+CREATE TABLE version_part_word_counts (
+    id SERIAL PRIMARY KEY,
+    title_number INTEGER NOT NULL,
+    part VARCHAR(100) NOT NULL,
+    version_date DATE NOT NULL,
+    ancestry JSONB,
+    word_statistics JSONB,
+    removed BOOLEAN DEFAULT false,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_version_part_word_counts UNIQUE (title_number, part, version_date)
+);
+
+DROP TABLE IF EXISTS version_division_word_counts CASCADE;
+
+-- Own-text word counts of every division down to the leaf types, per version. Any division's
+-- total is the sum over the rows whose ancestry contains it.
+CREATE TABLE version_division_word_counts (
+    id SERIAL PRIMARY KEY,
+    task_id INTEGER REFERENCES version_processing_jobs(id),
+    title_number INTEGER NOT NULL,
+    version_date DATE NOT NULL,
+    division_path TEXT NOT NULL,
+    type VARCHAR(100),
+    code VARCHAR(100),
+    ancestry JSONB,
+    word_statistics JSONB,
+    content_digest VARCHAR(32),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_version_division_word_counts UNIQUE (title_number, version_date, division_path)
+);
+
+DROP TABLE IF EXISTS word_transformations CASCADE;
+
+-- Append-only word transformation map: each row says `word` was derived from `original`.
+CREATE TABLE word_transformations (
+    word TEXT NOT NULL,
+    original TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (word, original)
+);
+
 
 I want to rename the content processing tasks table and the processing results table to something more appropriate and I want to use locks on records in the job table to avoid race condition between the workers.
\ No newline at end of file
@@ -1,37 +1,183 @@
+import asyncio
 import httpx
-from datetime import datetime
+import logging
+import shutil
+import tempfile
+import time
+from datetime import date, datetime
+from typing import Dict, IO, Iterable, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from models import models
+from config.base import settings
+from ecfr_fetcher.xml_cache import XMLCache
+from ecfr_fetcher.rate_limiter import AdaptiveTokenBucket, parse_retry_after
+from ecfr_fetcher.pool_metrics import PoolMetrics
 import json
 
 class ECFRFetcher:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, cache: Optional[XMLCache] = None, rate_limiter: Optional[AdaptiveTokenBucket] = None,
+                 max_retries: int = 5, max_connections: int = None, max_keepalive_connections: int = None,
+                 keepalive_expiry: float = None, http2: bool = None):
+        """
+        Creates a fetcher around one pooled httpx client. A fetcher is meant to be long-lived
+        (one per worker process) so TLS sessions and keep-alive connections are reused across
+        requests; close it with close() or use it as an async context manager.
+        Pool settings default to the ECFR_* values in config.
+        """
         self.base_url = base_url
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.metrics = PoolMetrics()
+        limits = httpx.Limits(
+            max_connections=max_connections or settings.ECFR_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive_connections or settings.ECFR_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=keepalive_expiry or settings.ECFR_KEEPALIVE_EXPIRY_SEC
+        )
+        http2 = settings.ECFR_HTTP2 if http2 is None else http2
+        if http2:
+            try:
+                import h2  # noqa: F401  (httpx needs the h2 package for HTTP/2)
+            except ImportError:
+                logging.warning("ECFR_HTTP2 is set but the h2 package is not installed; falling back to HTTP/1.1")
+                http2 = False
         # self.client = httpx.AsyncClient()
-        self.client = httpx.AsyncClient(timeout=900)
+        self.client = httpx.AsyncClient(timeout=settings.ECFR_TIMEOUT_SEC, limits=limits, http2=http2)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def open_connections(self) -> Optional[int]:
+        # httpx exposes no public pool introspection; peek at the transport's httpcore pool
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        return len(connections) if connections is not None else None
+
+    def pool_stats(self) -> dict:
+        """Returns connection pool metrics: requests, in-flight, open/new connections, reuse and pool wait time."""
+        return self.metrics.snapshot(self.open_connections())
+
+    async def _send_get(self, url: str) -> httpx.Response:
+        with self.metrics.track() as extensions:
+            return await self.client.get(url, extensions=extensions)
+
+    async def _get(self, url: str) -> httpx.Response:
+        """
+        GET through the rate limiter, if one is configured. 429 responses are retried after
+        the server's Retry-After delay, up to max_retries times, and each request's latency
+        is fed back so the limiter can adapt its rate. Raises httpx.HTTPStatusError if the
+        server still answers 429 after the last retry.
+        """
+        if self.rate_limiter is None:
+            return await self._send_get(url)
+        for _ in range(self.max_retries):
+            await self.rate_limiter.acquire()
+            started = time.monotonic()
+            response = await self._send_get(url)
+            if response.status_code != 429:
+                self.rate_limiter.observe(time.monotonic() - started)
+                return response
+            self.rate_limiter.backoff(parse_retry_after(response.headers.get("Retry-After")))
+        logging.warning(f"Still rate limited after {self.max_retries} attempts: {url}")
+        response.raise_for_status()
+        return response
     
     async def fetch_agencies(self) -> dict:
-        response = await self.client.get(f"{self.base_url}/admin/v1/agencies.json")
+        response = await self._get(f"{self.base_url}/admin/v1/agencies.json")
         return response.json()
     
     async def fetch_titles(self) -> dict:
-        response = await self.client.get(f"{self.base_url}/versioner/v1/titles.json")
+        response = await self._get(f"{self.base_url}/versioner/v1/titles.json")
         return response.json()
     
     async def fetch_title_versions(self, title_number: int) -> dict:
         """Fetch versions for a specific title"""
-        response = await self.client.get( f"{self.base_url}/versioner/v1/versions/title-{title_number}.json")
+        response = await self._get( f"{self.base_url}/versioner/v1/versions/title-{title_number}.json")
         if response.status_code == 404:
             return {"content_versions": []}
         return response.json()
     
     async def fetch_full_title(self, title_number: int, version_date: str) -> dict:
         """Fetch the full title given the title number and version date"""
-        response = await self.client.get(f"{self.base_url}/versioner/v1/full/{version_date}/title-{title_number}.xml")
+        response = await self._send_get(f"{self.base_url}/versioner/v1/full/{version_date}/title-{title_number}.xml")
         if response.status_code == 404:
             return {"title": {}}
         return response.text
+
+    async def full_title_size(self, title_number: int, version_date: str) -> Optional[int]:
+        """
+        Asks for the size of the full title XML with a HEAD request, without downloading it.
+        Returns None if the server does not report a Content-Length or the title does not exist.
+        """
+        url = f"{self.base_url}/versioner/v1/full/{version_date}/title-{title_number}.xml"
+        with self.metrics.track() as extensions:
+            response = await self.client.head(url, extensions=extensions)
+        length = response.headers.get("Content-Length")
+        if response.status_code != 200 or length is None or not length.isdigit():
+            return None
+        return int(length)
+
+    async def download_full_title(self, title_number: int, version_date: str, part: str = None,
+                                  target: IO[bytes] = None) -> Optional[IO[bytes]]:
+        """
+        Downloads the full title XML into a spooled temporary file positioned at the start.
+        The body stays in memory up to XML_SPOOL_MAX_SIZE bytes and spills to disk beyond that,
+        so peak memory does not grow with the size of the title. With a target, the body is
+        streamed into that binary file instead, e.g. a file on disk that is needed by path.
+
+        When a cache is configured, a cached payload is returned without touching the network
+        and fresh downloads are added to the cache.
+
+        Args:
+            part: Optionally restricts the download to a single part using the versioner's part filter.
+                  Part downloads bypass the cache.
+
+        Returns:
+            A binary file object (the target, if given) the caller is responsible for closing,
+            or None on 404.
+        """
+        use_cache = self.cache is not None and part is None
+        if use_cache:
+            cached = await asyncio.to_thread(self.cache.open, title_number, version_date)
+            if cached is not None:
+                logging.info(f"XML cache hit for title {title_number} @ {version_date}")
+                if target is None:
+                    return cached
+                with cached:
+                    await asyncio.to_thread(shutil.copyfileobj, cached, target)
+                target.seek(0)
+                return target
+
+        xml_file = target if target is not None else tempfile.SpooledTemporaryFile(max_size=settings.XML_SPOOL_MAX_SIZE)
+        url = f"{self.base_url}/versioner/v1/full/{version_date}/title-{title_number}.xml"
+        params = {"part": part} if part is not None else None
+        try:
+            with self.metrics.track() as extensions:
+                async with self.client.stream("GET", url, params=params, extensions=extensions) as response:
+                    if response.status_code == 404:
+                        if target is None:
+                            xml_file.close()
+                        return None
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes(settings.XML_STREAM_CHUNK_SIZE):
+                        xml_file.write(chunk)
+        except BaseException:
+            if target is None:
+                xml_file.close()
+            raise
+        xml_file.seek(0)
+        if use_cache:
+            try:
+                await asyncio.to_thread(self.cache.put, title_number, version_date, xml_file)
+            except OSError as e:
+                logging.warning(f"Could not cache title {title_number} @ {version_date}: {e}")
+                xml_file.seek(0)
+        return xml_file
     
     async def close(self):
         await self.client.aclose()
@@ -40,55 +186,168 @@ class DataProcessor:
     def __init__(self, session: AsyncSession):
         self.session = session
     
+    async def _bulk_upsert(self, model, rows: List[dict], conflict_columns: List[str]):
+        """
+        Writes rows with multi-row INSERT ... ON CONFLICT DO UPDATE statements of at most
+        BULK_UPSERT_BATCH_SIZE rows each, then commits once. Rows sharing a conflict key are
+        collapsed (last one wins) because Postgres rejects updating the same row twice in one statement.
+        """
+        if not rows:
+            return
+        unique_rows = list({tuple(row[c] for c in conflict_columns): row for row in rows}.values())
+        batch_size = settings.BULK_UPSERT_BATCH_SIZE
+        try:
+            for start in range(0, len(unique_rows), batch_size):
+                stmt = pg_insert(model.__table__).values(unique_rows[start:start + batch_size])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=conflict_columns,
+                    set_={column: stmt.excluded[column] for column in unique_rows[0] if column not in conflict_columns}
+                )
+                await self.session.execute(stmt)
+            await self.session.commit()
+        except Exception:
+            await self.session.rollback()
+            raise
+    
     async def process_agencies(self, agencies_data: dict):
-        for agency_data in agencies_data["agencies"]:
-            agency = models.Agency(
-                agency_id=agency_data["slug"],
-                name=agency_data["name"],
-                short_name=agency_data["short_name"],
-                display_name=agency_data["display_name"],
-                sortable_name=agency_data["sortable_name"],
-                docs=agency_data["cfr_references"],
-                slug=agency_data["slug"]
-            )
-            self.session.add(agency)
-        
-        await self.session.commit()
+        rows = [
+            {
+                "agency_id": agency_data["slug"],
+                "name": agency_data["name"],
+                "short_name": agency_data["short_name"],
+                "display_name": agency_data["display_name"],
+                "sortable_name": agency_data["sortable_name"],
+                "docs": agency_data["cfr_references"],
+                "slug": agency_data["slug"]
+            }
+            for agency_data in agencies_data["agencies"]
+        ]
+        await self._bulk_upsert(models.Agency, rows, ["slug"])
     
     async def process_titles(self, titles_data: dict):
+        rows = [
+            {
+                "number": title_data["number"],
+                "name": title_data["name"],
+                "latest_amended_on": _parse_date(title_data["latest_amended_on"]),
+                "latest_issue_date": _parse_date(title_data["latest_issue_date"]),
+                "up_to_date_as_of": _parse_date(title_data["up_to_date_as_of"]),
+                "reserved": title_data["reserved"]
+            }
+            for title_data in titles_data["titles"]
+        ]
+        await self._bulk_upsert(models.Title, rows, ["number"])
+
+    async def process_title_versions(self, title_number: int, versions_data: dict):
+        """Process and store title versions, updating versions that were already stored"""
+        rows = [
+            {
+                "title_number": title_number,
+                "version_date": _parse_date(version["date"]),
+                "amendment_date": _parse_date(version["amendment_date"]),
+                "issue_date": _parse_date(version["issue_date"]),
+                "identifier": version["identifier"],
+                "name": version["name"],
+                "part": version["part"],
+                "substantive": version["substantive"],
+                "removed": version["removed"],
+                "subpart": version.get("subpart"),  # Some might not have subpart
+                "type": version["type"]
+            }
+            for version in versions_data.get("content_versions", [])
+        ]
+        await self._bulk_upsert(models.TitleVersion, rows, ["title_number", "version_date", "identifier"])
+
+    async def process_new_agencies(self, agencies_data: dict) -> int:
+        """Inserts only the agencies whose slug is not stored yet and returns how many were added"""
+        result = await self.session.execute(select(models.Agency.slug))
+        existing_slugs = {row[0] for row in result}
+        new_agencies = [agency for agency in agencies_data["agencies"] if agency["slug"] not in existing_slugs]
+        if new_agencies:
+            await self.process_agencies({"agencies": new_agencies})
+        return len(new_agencies)
+
+    async def sync_titles(self, titles_data: dict) -> List[int]:
+        """
+        Inserts new titles and refreshes the names of stored ones from titles.json. The dates of
+        titles whose content may have changed are left alone until their versions are stored
+        (see mark_titles_synced), so a title whose version fetch fails is still reported as
+        changed on the next sync.
+
+        Returns:
+            The numbers of titles whose content may have changed since the last sync: new titles,
+            titles with a different latest_amended_on, and titles last stored before their latest
+            amendment was incorporated (up_to_date_as_of earlier than latest_amended_on).
+        """
+        result = await self.session.execute(select(models.Title))
+        stored_titles = {title.number: title for title in result.scalars()}
+        changed = []
+
         for title_data in titles_data["titles"]:
-            title = models.Title(
-                number=title_data["number"],
-                name=title_data["name"],
-                latest_amended_on=datetime.strptime(title_data["latest_amended_on"], "%Y-%m-%d").date() if title_data["latest_amended_on"] else None,
-                latest_issue_date=datetime.strptime(title_data["latest_issue_date"], "%Y-%m-%d").date() if title_data["latest_issue_date"] else None,
-                up_to_date_as_of=datetime.strptime(title_data["up_to_date_as_of"], "%Y-%m-%d").date() if title_data["up_to_date_as_of"] else None,
-                reserved=title_data["reserved"]
-            )
-            self.session.add(title)
-        
+            latest_amended_on = _parse_date(title_data["latest_amended_on"])
+            title = stored_titles.get(title_data["number"])
+            if title is None:
+                # Dates stay empty until the versions are stored
+                self.session.add(models.Title(
+                    number=title_data["number"],
+                    name=title_data["name"],
+                    reserved=title_data["reserved"]
+                ))
+                changed.append(title_data["number"])
+                continue
+
+            title.name = title_data["name"]
+            title.reserved = title_data["reserved"]
+            stale = (title.latest_amended_on != latest_amended_on
+                     or (title.up_to_date_as_of is not None and latest_amended_on is not None
+                         and title.up_to_date_as_of < latest_amended_on))
+            if stale:
+                changed.append(title.number)
+            else:
+                title.latest_issue_date = _parse_date(title_data["latest_issue_date"])
+                title.up_to_date_as_of = _parse_date(title_data["up_to_date_as_of"])
+
         await self.session.commit()
+        return changed
 
-    async def process_title_versions(self, title_number: int, versions_data: dict):
-        """Process and store title versions"""
-        for version in versions_data.get("content_versions", []):
-            title_version = models.TitleVersion(
-                title_number=title_number,
-                version_date=datetime.strptime(version["date"], "%Y-%m-%d").date(),
-                amendment_date=datetime.strptime(version["amendment_date"], "%Y-%m-%d").date(),
-                issue_date=datetime.strptime(version["issue_date"], "%Y-%m-%d").date(),
-                identifier=version["identifier"],
-                name=version["name"],
-                part=version["part"],
-                substantive=version["substantive"],
-                removed=version["removed"],
-                subpart=version.get("subpart"),  # Some might not have subpart
-                type=version["type"]
-            )
-            self.session.add(title_version)
-        
-        try:
-            await self.session.commit()
-        except Exception as e:
-            await self.session.rollback()
-            raise e
\ No newline at end of file
+    async def mark_titles_synced(self, titles_data: dict, title_numbers: Iterable[int]):
+        """Stores the titles.json dates of the given titles once their versions have been stored"""
+        title_numbers = set(title_numbers)
+        if not title_numbers:
+            return
+        result = await self.session.execute(select(models.Title).where(models.Title.number.in_(title_numbers)))
+        stored_titles = {title.number: title for title in result.scalars()}
+        for title_data in titles_data["titles"]:
+            title = stored_titles.get(title_data["number"])
+            if title is None:
+                continue
+            title.latest_amended_on = _parse_date(title_data["latest_amended_on"])
+            title.latest_issue_date = _parse_date(title_data["latest_issue_date"])
+            title.up_to_date_as_of = _parse_date(title_data["up_to_date_as_of"])
+        await self.session.commit()
+
+    async def fetch_latest_version_dates(self, title_numbers: Iterable[int]) -> Dict[int, date]:
+        """Returns the newest stored version_date for each of the given titles that has versions"""
+        result = await self.session.execute(
+            select(models.TitleVersion.title_number, func.max(models.TitleVersion.version_date))
+            .where(models.TitleVersion.title_number.in_(list(title_numbers)))
+            .group_by(models.TitleVersion.title_number)
+        )
+        return {title_number: version_date for title_number, version_date in result}
+
+
+def newer_versions(versions_data: dict, since: Optional[date]) -> dict:
+    """Keeps only the content versions dated after `since` (all of them when since is None)"""
+    if since is None:
+        return versions_data
+    return {
+        **versions_data,
+        "content_versions": [
+            version for version in versions_data.get("content_versions", [])
+            if _parse_date(version["date"]) > since
+        ]
+    }
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    return datetime.strptime(value, "%Y-%m-%d").date() if value else None
@@ -1,32 +1,133 @@
 import asyncio
 from config.base import settings
 from db.db import AsyncSessionLocal
-from app.fetcher import ECFRFetcher, DataProcessor
+from ecfr_fetcher.fetcher import ECFRFetcher, DataProcessor, newer_versions
+from ecfr_fetcher.rate_limiter import AdaptiveTokenBucket
 
 from models import models
 from sqlalchemy import select
 
-async def fetch_all_title_versions(session, fetcher, processor):
-    """Fetch versions for all titles"""
+async def _title_numbers(session, title_numbers):
+    if title_numbers is not None:
+        return list(title_numbers)
     # Get all title numbers from the database
     result = await session.execute(select(models.Title.number))
-    title_numbers = [row[0] for row in result]
+    return [row[0] for row in result]
+
+async def fetch_all_title_versions(session, fetcher, processor, title_numbers=None, since=None):
+    """
+    Fetch versions for all titles, or only `title_numbers` when given.
+    `since` optionally maps a title number to its last stored version_date; only newer versions are inserted.
+    Returns the numbers of the titles whose versions were stored; failed titles are skipped.
+    """
+    title_numbers = await _title_numbers(session, title_numbers)
+    since = since or {}
+    stored = []
     
     for title_number in title_numbers:
         try:
             print(f"Fetching versions for title {title_number}")
             versions_data = await fetcher.fetch_title_versions(title_number)
+            versions_data = newer_versions(versions_data, since.get(title_number))
             await processor.process_title_versions(title_number, versions_data)
+            stored.append(title_number)
         except Exception as e:
             print(f"Error processing title {title_number}: {str(e)}")
             continue
+    return stored
+
+async def fetch_all_title_versions_concurrent(session, fetcher, processor, concurrency: int, title_numbers=None, since=None):
+    """
+    Fetch versions for all titles with up to `concurrency` requests in flight.
+    Requests are paced by the fetcher's rate limiter, and a single consumer inserts each
+    title's versions as soon as they arrive, so database writes overlap with the remaining
+    HTTP fetches. The session is only ever used by the consumer.
+    `title_numbers`, `since` and the return value are as in fetch_all_title_versions.
+    """
+    title_numbers = await _title_numbers(session, title_numbers)
+    since = since or {}
+    stored = []
+
+    semaphore = asyncio.Semaphore(concurrency)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def fetch_one(title_number):
+        async with semaphore:
+            try:
+                print(f"Fetching versions for title {title_number}")
+                versions_data = await fetcher.fetch_title_versions(title_number)
+            except Exception as e:
+                print(f"Error fetching title {title_number}: {str(e)}")
+                return
+        versions_data = newer_versions(versions_data, since.get(title_number))
+        await queue.put((title_number, versions_data))
+
+    async def store_all():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            title_number, versions_data = item
+            try:
+                await processor.process_title_versions(title_number, versions_data)
+                stored.append(title_number)
+            except Exception as e:
+                print(f"Error processing title {title_number}: {str(e)}")
+
+    consumer = asyncio.create_task(store_all())
+    try:
+        await asyncio.gather(*(fetch_one(title_number) for title_number in title_numbers))
+        await queue.put(None)
+        await consumer
+    finally:
+        consumer.cancel()
+    return stored
+
+async def sync_title_versions(session, fetcher, processor, title_numbers=None, since=None):
+    if settings.FETCHER_CONCURRENCY > 1:
+        return await fetch_all_title_versions_concurrent(session, fetcher, processor, settings.FETCHER_CONCURRENCY, title_numbers, since)
+    else:
+        return await fetch_all_title_versions(session, fetcher, processor, title_numbers, since)
+
+async def incremental_sync(session, fetcher, processor):
+    """
+    Sync only what changed since the last run: new agencies, new or amended titles, and
+    for those titles only the versions newer than the last stored version_date. A title's
+    dates are only updated once its versions are stored, so a title whose fetch fails (e.g. a
+    429 or 5xx) is picked up again by the next run.
+    """
+    agencies_data = await fetcher.fetch_agencies()
+    added = await processor.process_new_agencies(agencies_data)
+    print(f"Added {added} new agencies")
+
+    titles_data = await fetcher.fetch_titles()
+    changed_titles = await processor.sync_titles(titles_data)
+    if not changed_titles:
+        print("All titles are up to date")
+        return
+    print(f"Titles changed since last sync: {changed_titles}")
+
+    since = await processor.fetch_latest_version_dates(changed_titles)
+    stored = await sync_title_versions(session, fetcher, processor, changed_titles, since)
+    await processor.mark_titles_synced(titles_data, stored)
+    if len(stored) < len(changed_titles):
+        print(f"Titles left for the next sync: {sorted(set(changed_titles) - set(stored))}")
         
 async def main():
     async with AsyncSessionLocal() as session:
-        fetcher = ECFRFetcher(settings.ECFR_BASE_URL)
+        rate_limiter = AdaptiveTokenBucket(
+            rate=settings.ECFR_RATE_LIMIT_PER_SEC,
+            burst=settings.FETCHER_CONCURRENCY,
+            target_latency=settings.ECFR_TARGET_LATENCY_SEC
+        )
+        fetcher = ECFRFetcher(settings.ECFR_BASE_URL, rate_limiter=rate_limiter)
         processor = DataProcessor(session)
         
         try:
+            if settings.FETCHER_SYNC_MODE == "incremental":
+                await incremental_sync(session, fetcher, processor)
+                return
+
             # Fetch and process agencies
             agencies_data = await fetcher.fetch_agencies()
             await processor.process_agencies(agencies_data)
@@ -36,7 +137,7 @@ async def main():
             await processor.process_titles(titles_data)
             
             # Fetch and process title versions
-            await fetch_all_title_versions(session, fetcher, processor)
+            await sync_title_versions(session, fetcher, processor)
         finally:
             await fetcher.close()
 
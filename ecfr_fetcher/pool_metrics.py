@@ -0,0 +1,67 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class PoolMetrics:
+    """
+    Connection pool metrics for an ECFRFetcher's HTTP client.
+
+    Each request carries an httpcore trace hook that reports when new TCP connections are
+    opened and when the request headers start going out on a connection. A request that
+    never opened a connection reused a kept-alive one, and the time it spent before sending
+    headers, minus any connect/TLS time, is time spent waiting for a free pool slot.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextmanager
+    def track(self) -> Iterator[dict]:
+        """
+        Tracks one request for the duration of the block and yields the httpx request
+        extensions (the trace hook) to send it with.
+        """
+        started = time.monotonic()
+        state = {"connecting_since": None, "connect_time": 0.0, "waited": False}
+
+        async def trace(event_name: str, info: dict):
+            now = time.monotonic()
+            if event_name in ("connection.connect_tcp.started", "connection.start_tls.started"):
+                state["connecting_since"] = now
+            elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                if state["connecting_since"] is not None:
+                    state["connect_time"] += now - state["connecting_since"]
+                if event_name == "connection.connect_tcp.complete":
+                    self.new_connections += 1
+            elif event_name.endswith("send_request_headers.started") and not state["waited"]:
+                state["waited"] = True
+                wait = max(0.0, now - started - state["connect_time"])
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield {"trace": trace}
+        finally:
+            self.in_flight -= 1
+
+    def snapshot(self, open_connections: Optional[int] = None) -> dict:
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "open_connections": open_connections,
+            "new_connections": self.new_connections,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else None,
+            "avg_pool_wait_ms": round(1000 * self.total_wait / self.requests, 1) if self.requests else None,
+            "max_pool_wait_ms": round(1000 * self.max_wait, 1),
+        }
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+class AdaptiveTokenBucket:
+    """
+    Token-bucket rate limiter shared by concurrent eCFR API requests.
+
+    Tokens refill at `rate` per second up to `burst`. The rate adapts to the API's behaviour:
+    responses slower than target_latency shrink it multiplicatively, fast responses grow it
+    additively back toward max_rate, and a 429 halves it and blocks every caller until the
+    server's Retry-After has elapsed.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, min_rate: float = 0.2, max_rate: float = None,
+                 target_latency: float = 5.0):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate
+        self.target_latency = target_latency
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Waits until a request may be sent."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def observe(self, latency: float):
+        """Feeds back the latency of a completed request."""
+        if latency > self.target_latency:
+            self.rate = max(self.min_rate, self.rate * 0.75)
+        else:
+            self.rate = min(self.max_rate, self.rate + 0.1 * self.max_rate)
+
+    def backoff(self, retry_after: Optional[float]):
+        """Reacts to a 429 by halving the rate and pausing all callers for retry_after seconds."""
+        self.rate = max(self.min_rate, self.rate / 2)
+        delay = retry_after if retry_after is not None else 1 / self.rate
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        self.tokens = 0
+        logging.warning(f"Rate limited by eCFR API; pausing {delay:.1f}s, rate now {self.rate:.2f}/s")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header given either as delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,323 @@
+# ecfr_fetcher/stub_server.py
+"""
+Local stand-in for the eCFR API, for load-testing ECFRFetcher and the job processors offline.
+
+Serves the endpoints the pipeline uses under /api:
+    /api/admin/v1/agencies.json
+    /api/versioner/v1/titles.json
+    /api/versioner/v1/versions/title-{n}.json
+    /api/versioner/v1/full/{date}/title-{n}.xml[?part=N]
+
+Responses come from a fixtures directory laid out like the URL paths (e.g.
+fixtures/versioner/v1/titles.json); anything without a fixture is synthesized
+deterministically from the request, so runs are reproducible. With --record-from, misses
+are fetched from the real API once and saved as fixtures instead.
+
+Latency, bandwidth, error rate and 429 throttling are configurable, e.g.:
+    python -m ecfr_fetcher.stub_server --port 8080 --latency-ms 300 --bandwidth-kbps 2000 \\
+        --error-rate 0.02 --throttle-rps 5
+and then run the fetcher or job processor with ECFR_BASE_URL=http://localhost:8080/api.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+import httpx
+from aiohttp import web
+
+WORDS = (
+    "agency applicant authority certification compliance determination eligible enforcement "
+    "equipment exemption facility federal inspection installation licensee maintenance operator "
+    "permit procedure program recordkeeping regulation reporting requirement review safety "
+    "secretary standard submission system transportation violation waiver"
+).split()
+
+ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
+
+
+class StubConfig:
+    def __init__(self, fixtures_dir: str = None, latency_ms: float = 0, latency_jitter_ms: float = 0,
+                 bandwidth_kbps: float = 0, error_rate: float = 0, throttle_rate: float = 0,
+                 throttle_rps: float = 0, retry_after: int = 1, record_from: str = None, seed: int = 0,
+                 titles: int = 50, versions_per_title: int = 20, chapters: int = 3,
+                 parts_per_chapter: int = 10, sections_per_part: int = 10, words_per_section: int = 300):
+        self.fixtures_dir = fixtures_dir
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.bandwidth_kbps = bandwidth_kbps  # 0 = unlimited
+        self.error_rate = error_rate  # probability of a 500 response
+        self.throttle_rate = throttle_rate  # probability of a random 429 response
+        self.throttle_rps = throttle_rps  # requests/second above which 429s are returned; 0 = unlimited
+        self.retry_after = retry_after
+        self.record_from = record_from
+        self.seed = seed
+        self.titles = titles
+        self.versions_per_title = versions_per_title
+        self.chapters = chapters
+        self.parts_per_chapter = parts_per_chapter
+        self.sections_per_part = sections_per_part
+        self.words_per_section = words_per_section
+
+
+class SyntheticECFR:
+    """Deterministic synthetic eCFR data; the same request always yields the same payload."""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+
+    def version_dates(self, title_number: int):
+        rng = random.Random(f"{self.config.seed}-dates-{title_number}")
+        day = date(2017, 1, 3)
+        dates = []
+        for _ in range(self.config.versions_per_title):
+            day += timedelta(days=rng.randint(7, 120))
+            dates.append(day)
+        return dates
+
+    def agencies(self) -> dict:
+        agencies = []
+        for title_number in range(1, self.config.titles + 1):
+            slug = f"synthetic-agency-{title_number}"
+            agencies.append({
+                "name": f"Synthetic Agency {title_number}",
+                "short_name": f"SA{title_number}",
+                "display_name": f"Synthetic Agency {title_number}",
+                "sortable_name": f"Synthetic Agency {title_number}",
+                "slug": slug,
+                "children": [],
+                "cfr_references": [{"title": title_number, "chapter": ROMAN[0]}]
+            })
+        return {"agencies": agencies}
+
+    def titles(self) -> dict:
+        titles = []
+        for title_number in range(1, self.config.titles + 1):
+            latest = self.version_dates(title_number)[-1].isoformat()
+            titles.append({
+                "number": title_number,
+                "name": f"Synthetic Title {title_number}",
+                "latest_amended_on": latest,
+                "latest_issue_date": latest,
+                "up_to_date_as_of": latest,
+                "reserved": False
+            })
+        return {"titles": titles}
+
+    def versions(self, title_number: int) -> dict:
+        rng = random.Random(f"{self.config.seed}-versions-{title_number}")
+        total_parts = self.config.chapters * self.config.parts_per_chapter
+        content_versions = []
+        for version_date in self.version_dates(title_number):
+            part = str(100 + rng.randrange(total_parts))
+            section = f"{part}.{1 + rng.randrange(self.config.sections_per_part)}"
+            content_versions.append({
+                "date": version_date.isoformat(),
+                "amendment_date": version_date.isoformat(),
+                "issue_date": version_date.isoformat(),
+                "identifier": section,
+                "name": f"§ {section} Synthetic section.",
+                "part": part,
+                "substantive": True,
+                "removed": False,
+                "subpart": None,
+                "title": str(title_number),
+                "type": "section"
+            })
+        return {"content_versions": content_versions, "meta": {"title": str(title_number)}}
+
+    def _section(self, title_number: int, version_date: str, part: str, index: int) -> str:
+        rng = random.Random(f"{self.config.seed}-{title_number}-{version_date}-{part}-{index}")
+        text = " ".join(rng.choice(WORDS) for _ in range(self.config.words_per_section))
+        return (f'<DIV8 N="{part}.{index}" TYPE="SECTION"><HEAD>§ {part}.{index} Synthetic section.</HEAD>'
+                f'<P>{text}</P></DIV8>\n')
+
+    def full_title(self, title_number: int, version_date: str, part: Optional[str] = None) -> bytes:
+        pieces = [f'<?xml version="1.0" encoding="UTF-8"?>\n<DIV1 N="{title_number}" TYPE="TITLE">'
+                  f'<HEAD>Title {title_number}—Synthetic</HEAD>\n']
+        for chapter in range(self.config.chapters):
+            chapter_n = ROMAN[chapter % len(ROMAN)]
+            part_numbers = [str(100 + chapter * self.config.parts_per_chapter + i) for i in range(self.config.parts_per_chapter)]
+            if part is not None and part not in part_numbers:
+                continue
+            pieces.append(f'<DIV3 N="{chapter_n}" TYPE="CHAPTER"><HEAD>CHAPTER {chapter_n}—SYNTHETIC</HEAD>\n')
+            for part_n in part_numbers:
+                if part is not None and part_n != part:
+                    continue
+                pieces.append(f'<DIV5 N="{part_n}" TYPE="PART"><HEAD>PART {part_n}—SYNTHETIC</HEAD>\n')
+                for index in range(1, self.config.sections_per_part + 1):
+                    pieces.append(self._section(title_number, version_date, part_n, index))
+                pieces.append('</DIV5>\n')
+            pieces.append('</DIV3>\n')
+        pieces.append('</DIV1>\n')
+        return "".join(pieces).encode("utf-8")
+
+
+class StubServer:
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.synthetic = SyntheticECFR(config)
+        self.rng = random.Random(config.seed)
+        self.window_started = time.monotonic()
+        self.window_requests = 0
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0, "bytes": 0}
+        self.upstream = httpx.AsyncClient(timeout=900) if config.record_from else None
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.fault_injection])
+        app.router.add_get("/api/admin/v1/agencies.json", self.agencies)
+        app.router.add_get("/api/versioner/v1/titles.json", self.titles)
+        app.router.add_get("/api/versioner/v1/versions/title-{title:\\d+}.json", self.versions)
+        app.router.add_get("/api/versioner/v1/full/{date}/title-{title:\\d+}.xml", self.full_title)
+        app.router.add_get("/stub/stats", self.stats_handler)
+        app.on_cleanup.append(self._close_upstream)
+        return app
+
+    async def _close_upstream(self, app):
+        if self.upstream is not None:
+            await self.upstream.aclose()
+
+    def _throttled(self) -> bool:
+        if self.config.throttle_rate and self.rng.random() < self.config.throttle_rate:
+            return True
+        if self.config.throttle_rps:
+            now = time.monotonic()
+            if now - self.window_started >= 1:
+                self.window_started = now
+                self.window_requests = 0
+            self.window_requests += 1
+            return self.window_requests > self.config.throttle_rps
+        return False
+
+    @web.middleware
+    async def fault_injection(self, request: web.Request, handler):
+        if request.path.startswith("/stub/"):
+            return await handler(request)
+        self.stats["requests"] += 1
+        if self._throttled():
+            self.stats["throttled"] += 1
+            return web.Response(status=429, headers={"Retry-After": str(self.config.retry_after)}, text="Too Many Requests")
+        delay = self.config.latency_ms + self.rng.uniform(0, self.config.latency_jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if self.config.error_rate and self.rng.random() < self.config.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=500, text="Injected server error")
+        return await handler(request)
+
+    def _fixture_path(self, request: web.Request) -> Optional[str]:
+        if not self.config.fixtures_dir:
+            return None
+        relative = request.path[len("/api/"):]
+        if request.query.get("part"):
+            relative += f".part-{request.query['part']}"
+        return os.path.join(self.config.fixtures_dir, relative)
+
+    async def _respond(self, request: web.Request, body: bytes, content_type: str) -> web.StreamResponse:
+        """Sends the body in chunks, paced to the configured bandwidth."""
+        response = web.StreamResponse(headers={"Content-Type": content_type})
+        response.content_length = len(body)
+        await response.prepare(request)
+        chunk_size = 64 * 1024
+        for start in range(0, len(body), chunk_size):
+            chunk = body[start:start + chunk_size]
+            await response.write(chunk)
+            self.stats["bytes"] += len(chunk)
+            if self.config.bandwidth_kbps:
+                await asyncio.sleep(len(chunk) / (self.config.bandwidth_kbps * 1024))
+        await response.write_eof()
+        return response
+
+    async def _serve(self, request: web.Request, content_type: str, synthesize) -> web.StreamResponse:
+        path = self._fixture_path(request)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                return await self._respond(request, f.read(), content_type)
+
+        if self.upstream is not None:
+            upstream = await self.upstream.get(f"{self.config.record_from.rstrip('/')}{request.path[len('/api'):]}",
+                                               params=dict(request.query))
+            if upstream.status_code != 200:
+                return web.Response(status=upstream.status_code, body=upstream.content)
+            if path:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(upstream.content)
+            return await self._respond(request, upstream.content, content_type)
+
+        body = synthesize()
+        if body is None:
+            raise web.HTTPNotFound()
+        return await self._respond(request, body, content_type)
+
+    async def agencies(self, request: web.Request):
+        return await self._serve(request, "application/json",
+                                 lambda: json.dumps(self.synthetic.agencies()).encode())
+
+    async def titles(self, request: web.Request):
+        return await self._serve(request, "application/json",
+                                 lambda: json.dumps(self.synthetic.titles()).encode())
+
+    async def versions(self, request: web.Request):
+        title_number = int(request.match_info["title"])
+        return await self._serve(request, "application/json", lambda: (
+            json.dumps(self.synthetic.versions(title_number)).encode()
+            if title_number <= self.config.titles else None
+        ))
+
+    async def full_title(self, request: web.Request):
+        title_number = int(request.match_info["title"])
+        version_date = request.match_info["date"]
+        return await self._serve(request, "application/xml", lambda: (
+            self.synthetic.full_title(title_number, version_date, request.query.get("part"))
+            if title_number <= self.config.titles else None
+        ))
+
+    async def stats_handler(self, request: web.Request):
+        return web.json_response(self.stats)
+
+
+async def start_stub_server(config: StubConfig, host: str = "127.0.0.1", port: int = 8080) -> web.AppRunner:
+    """Starts the stand-in server in the running event loop; call runner.cleanup() to stop it."""
+    runner = web.AppRunner(StubServer(config).app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"eCFR stand-in server listening on http://{host}:{port}/api")
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the eCFR API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--fixtures", dest="fixtures_dir", help="directory of recorded responses laid out like the API paths")
+    parser.add_argument("--record-from", help="real API base URL (e.g. https://www.ecfr.gov/api) to record missing fixtures from")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0)
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="per-response bandwidth in KiB/s; 0 = unlimited")
+    parser.add_argument("--error-rate", type=float, default=0, help="probability of a 500 response")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="probability of a random 429 response")
+    parser.add_argument("--throttle-rps", type=float, default=0, help="return 429 above this many requests per second")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--titles", type=int, default=50)
+    parser.add_argument("--versions-per-title", type=int, default=20)
+    parser.add_argument("--chapters", type=int, default=3)
+    parser.add_argument("--parts-per-chapter", type=int, default=10)
+    parser.add_argument("--sections-per-part", type=int, default=10)
+    parser.add_argument("--words-per-section", type=int, default=300)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    options = vars(args)
+    host, port = options.pop("host"), options.pop("port")
+    web.run_app(StubServer(StubConfig(**options)).app(), host=host, port=port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class XMLCache:
+    """
+    On-disk cache of full-title XML payloads keyed by (title_number, version_date).
+
+    Payloads are stored gzip-compressed under their SHA-256 content hash, so versions whose
+    XML is byte-identical share a single blob. A small SQLite index maps each key to its
+    blob and tracks blob sizes and last access times; once the compressed total exceeds
+    max_bytes, the least recently used blobs are evicted. The index and the atomic renames
+    make the cache safe to share between worker processes on the same volume.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_path = os.path.join(cache_dir, "index.sqlite3")
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS versions (
+                    title_number INTEGER NOT NULL,
+                    version_date TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    PRIMARY KEY (title_number, version_date)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    digest TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    raw_size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_last_access ON blobs(last_access)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with conn:  # commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.xml.gz")
+
+    def get_path(self, title_number: int, version_date) -> Optional[str]:
+        """
+        Returns the path of the compressed blob cached for the title version, or None on a miss.
+        A hit refreshes the blob's position in the LRU order.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT digest FROM versions WHERE title_number = ? AND version_date = ?",
+                (title_number, str(version_date))
+            ).fetchone()
+            if row is None:
+                return None
+            digest = row[0]
+            path = self._blob_path(digest)
+            if not os.path.exists(path):
+                # Blob evicted or removed out from under us; forget the stale index entries
+                conn.execute("DELETE FROM versions WHERE digest = ?", (digest,))
+                conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                return None
+            conn.execute("UPDATE blobs SET last_access = ? WHERE digest = ?", (time.time(), digest))
+        return path
+
+    def raw_size(self, title_number: int, version_date=None) -> Optional[int]:
+        """
+        Returns the uncompressed size of the cached XML for the title version or, when that
+        version is not cached (or version_date is None), of the title's latest cached version.
+        Returns None if nothing is cached for the title. Does not count as an access.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT blobs.raw_size FROM versions JOIN blobs ON blobs.digest = versions.digest
+                WHERE versions.title_number = ?
+                ORDER BY versions.version_date = ? DESC, versions.version_date DESC
+                LIMIT 1
+                """,
+                (title_number, str(version_date))
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def open(self, title_number: int, version_date) -> Optional[IO[bytes]]:
+        """
+        Opens the cached XML for reading as a decompressing binary stream, or returns None on a miss.
+        """
+        path = self.get_path(title_number, version_date)
+        if path is None:
+            return None
+        try:
+            return gzip.open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+    def put(self, title_number: int, version_date, xml_file: IO[bytes]) -> str:
+        """
+        Stores the XML read from xml_file under the title version and returns its content hash.
+        The payload is hashed and compressed in a single pass; if an identical payload is
+        already cached, only the index entry is added. xml_file is rewound afterwards.
+        """
+        xml_file.seek(0)
+        digest = hashlib.sha256()
+        raw_size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp, gzip.GzipFile(fileobj=tmp, mode="wb", compresslevel=6, mtime=0) as gz:
+                for chunk in iter(lambda: xml_file.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    gz.write(chunk)
+                    raw_size += len(chunk)
+            hex_digest = digest.hexdigest()
+            blob_path = self._blob_path(hex_digest)
+            if os.path.exists(blob_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(tmp_path, blob_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            xml_file.seek(0)
+
+        size = os.path.getsize(blob_path)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs (digest, size, raw_size, last_access) VALUES (?, ?, ?, ?)",
+                (hex_digest, size, raw_size, time.time())
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO versions (title_number, version_date, digest) VALUES (?, ?, ?)",
+                (title_number, str(version_date), hex_digest)
+            )
+        logging.debug(f"Cached title {title_number} @ {version_date} as {hex_digest} ({raw_size} -> {size} bytes)")
+        self.evict()
+        return hex_digest
+
+    def evict(self):
+        """Removes least recently used blobs until the compressed total fits within max_bytes."""
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for digest, size in conn.execute("SELECT digest, size FROM blobs ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                conn.execute("DELETE FROM versions WHERE digest = ?", (digest,))
+                conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                total -= size
+                logging.info(f"Evicted cached XML blob {digest} ({size} bytes)")
+
+    def stats(self) -> dict:
+        """Returns entry counts and compressed/raw byte totals for monitoring."""
+        with self._connect() as conn:
+            versions = conn.execute("SELECT COUNT(*) FROM versions").fetchone()[0]
+            blobs, size, raw_size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(raw_size), 0) FROM blobs"
+            ).fetchone()
+        return {"versions": versions, "blobs": blobs, "bytes": size, "raw_bytes": raw_size}
@@ -0,0 +1,79 @@
+"""
+Benchmarks ECFRFetcher against the local eCFR stand-in server (ecfr_fetcher/stub_server.py)
+so fetch concurrency and retry behaviour can be compared reproducibly without network access.
+
+    python misc/bench_fetcher.py --concurrency 1 4 8 --latency-ms 200 --bandwidth-kbps 4000 --throttle-rps 10
+"""
+import argparse
+import asyncio
+import time
+
+from ecfr_fetcher.fetcher import ECFRFetcher
+from ecfr_fetcher.rate_limiter import AdaptiveTokenBucket
+from ecfr_fetcher.stub_server import StubConfig, SyntheticECFR, start_stub_server
+
+
+async def bench_downloads(base_url: str, jobs, concurrency: int, rate: float) -> dict:
+    rate_limiter = AdaptiveTokenBucket(rate=rate, burst=concurrency) if rate else None
+    semaphore = asyncio.Semaphore(concurrency)
+    downloaded = {"bytes": 0, "failed": 0}
+
+    async with ECFRFetcher(base_url, rate_limiter=rate_limiter, max_connections=concurrency) as fetcher:
+        async def versions_then_download(title_number, version_date):
+            async with semaphore:
+                try:
+                    await fetcher.fetch_title_versions(title_number)
+                    xml_file = await fetcher.download_full_title(title_number, version_date)
+                    xml_file.seek(0, 2)
+                    downloaded["bytes"] += xml_file.tell()
+                    xml_file.close()
+                except Exception:
+                    downloaded["failed"] += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(versions_then_download(t, d) for t, d in jobs))
+        elapsed = time.monotonic() - started
+        pool = fetcher.pool_stats()
+
+    return {
+        "concurrency": concurrency,
+        "jobs": len(jobs),
+        "failed": downloaded["failed"],
+        "seconds": round(elapsed, 2),
+        "jobs_per_sec": round(len(jobs) / elapsed, 2),
+        "mib_per_sec": round(downloaded["bytes"] / elapsed / 2**20, 2),
+        "reuse_ratio": pool["reuse_ratio"],
+        "avg_pool_wait_ms": pool["avg_pool_wait_ms"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark ECFRFetcher against the local stand-in server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--jobs", type=int, default=40)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=0, help="client-side rate limit in requests/second; 0 = none")
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--bandwidth-kbps", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--throttle-rps", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = StubConfig(latency_ms=args.latency_ms, bandwidth_kbps=args.bandwidth_kbps, error_rate=args.error_rate,
+                        throttle_rps=args.throttle_rps, seed=args.seed, titles=10)
+    synthetic = SyntheticECFR(config)
+    jobs = [(title_number, version_date.isoformat())
+            for title_number in range(1, config.titles + 1)
+            for version_date in synthetic.version_dates(title_number)][:args.jobs]
+
+    runner = await start_stub_server(config, port=args.port)
+    try:
+        for concurrency in args.concurrency:
+            print(await bench_downloads(f"http://127.0.0.1:{args.port}/api", jobs, concurrency, args.rate))
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
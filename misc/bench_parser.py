@@ -0,0 +1,76 @@
+"""
+Benchmarks the XML parser engines of TextProcessor ("etree", "lxml" and "expat"), reading a
+synthetic title from the eCFR stand-in (ecfr_fetcher/stub_server.py) from a plain and a gzipped
+file, with and without memory-mapping, and checks that every engine produces the same counts.
+
+    python misc/bench_parser.py --chapters 6 --parts-per-chapter 20 --repeat 3
+"""
+import argparse
+import gzip
+import os
+import tempfile
+import time
+
+from data_parser.content_parser import count_divisions_in_file, count_division_own_words_in_file
+from ecfr_fetcher.stub_server import StubConfig, SyntheticECFR
+
+
+def bench_engine(engine: str, xml_path: str, path: dict, use_mmap: bool, repeat: int) -> dict:
+    best_mapped = best_own = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        divisions, _ = count_divisions_in_file(xml_path, path, "counter", engine, use_mmap)
+        best_mapped = min(best_mapped, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        own, _ = count_division_own_words_in_file(xml_path, {"part"}, None, None, "counter", engine, use_mmap)
+        best_own = min(best_own, time.perf_counter() - started)
+
+    return {
+        "engine": engine,
+        "file": os.path.basename(xml_path),
+        "mmap": use_mmap,
+        "mapped_divisions_sec": round(best_mapped, 3),
+        "own_counts_sec": round(best_own, 3),
+        "counts": (divisions, [row[:5] for row in own]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the TextProcessor XML parser engines")
+    parser.add_argument("--chapters", type=int, default=6)
+    parser.add_argument("--parts-per-chapter", type=int, default=20)
+    parser.add_argument("--sections-per-part", type=int, default=10)
+    parser.add_argument("--words-per-section", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engines", nargs="+", default=["etree", "lxml", "expat"])
+    args = parser.parse_args()
+
+    config = StubConfig(chapters=args.chapters, parts_per_chapter=args.parts_per_chapter,
+                        sections_per_part=args.sections_per_part, words_per_section=args.words_per_section)
+    xml = SyntheticECFR(config).full_title(1, "2020-01-01")
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+    path = {"chapter": None, "part": None}
+
+    with tempfile.TemporaryDirectory() as directory:
+        plain_path = os.path.join(directory, "title.xml")
+        with open(plain_path, "wb") as xml_file:
+            xml_file.write(xml)
+        with gzip.open(plain_path + ".gz", "wb") as xml_file:
+            xml_file.write(xml)
+
+        results = [bench_engine(engine, xml_path, path, use_mmap, args.repeat)
+                   for xml_path in (plain_path, plain_path + ".gz")
+                   for use_mmap in (False, True)
+                   for engine in args.engines]
+
+    for result in results:
+        print({key: value for key, value in result.items() if key != "counts"})
+    if any(result["counts"] != results[0]["counts"] for result in results[1:]):
+        raise SystemExit("Parser engines disagree on the word counts")
+    print("All parser engines produced identical counts.")
+
+
+if __name__ == "__main__":
+    main()
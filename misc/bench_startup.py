@@ -0,0 +1,48 @@
+"""
+Measures how long a fresh worker process takes to become ready for its first job: importing
+the content parser, building a TextProcessor and counting a first (small) title, which is
+when the Porter stemmer is loaded. Each run is a new interpreter, as on a pod scale-out.
+
+    python misc/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+from data_parser.content_parser import TextProcessor
+imported = time.perf_counter()
+processor = TextProcessor('<DIV5 N="1" TYPE="PART"><P>Regulations governing the inspection of widgets.</P></DIV5>')
+constructed = time.perf_counter()
+list(processor.iter_division_word_counts({"part": None}))
+counted = time.perf_counter()
+print(json.dumps({"import": imported - started, "construct": constructed - imported, "first_count": counted - constructed}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark worker startup time")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=repo_root)
+    runs = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", CHILD], env=env, check=True, capture_output=True, text=True).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        timings["process_total"] = time.perf_counter() - started
+        runs.append(timings)
+
+    print({key: f"{1000 * statistics.median(run[key] for run in runs):.0f} ms" for key in runs[0]})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmarks the word count backends of TextProcessor ("counter" and "numpy") on a synthetic
+title from the eCFR stand-in (ecfr_fetcher/stub_server.py), checking that both produce the
+same counts.
+
+    python misc/bench_tokenizer.py --chapters 6 --parts-per-chapter 20 --repeat 3
+"""
+import argparse
+import asyncio
+import time
+
+from data_parser.content_parser import TextProcessor
+from ecfr_fetcher.stub_server import StubConfig, SyntheticECFR
+
+
+async def count_texts(processor: TextProcessor, texts: list) -> list:
+    return [await processor.aggregate_word_counts_stemming_numeric_filter(text) for text in texts]
+
+
+def bench_backend(backend: str, xml: str, path: dict, division_texts: list, repeat: int) -> dict:
+    processor = TextProcessor(xml, count_backend=backend)
+    best_single_pass = best_text = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        division_counts = {(type, code): counts for type, code, _, counts in processor.iter_division_word_counts(path)}
+        best_single_pass = min(best_single_pass, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        text_counts = asyncio.run(count_texts(processor, division_texts))
+        best_text = min(best_text, time.perf_counter() - started)
+
+    tokens = sum(len(text.split()) for text in division_texts)
+    return {
+        "backend": processor.count_backend.name,
+        "single_pass_sec": round(best_single_pass, 3),
+        "division_texts_sec": round(best_text, 3),
+        "division_text_tokens_per_sec": round(tokens / best_text),
+        "counts": (division_counts, text_counts),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the TextProcessor word count backends")
+    parser.add_argument("--chapters", type=int, default=6)
+    parser.add_argument("--parts-per-chapter", type=int, default=20)
+    parser.add_argument("--sections-per-part", type=int, default=10)
+    parser.add_argument("--words-per-section", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backends", nargs="+", default=["counter", "numpy"])
+    args = parser.parse_args()
+
+    config = StubConfig(chapters=args.chapters, parts_per_chapter=args.parts_per_chapter,
+                        sections_per_part=args.sections_per_part, words_per_section=args.words_per_section)
+    xml = SyntheticECFR(config).full_title(1, "2020-01-01")
+    path = {"chapter": None, "part": None}
+    extractor = TextProcessor(xml)
+    division_texts = [text for _, _, _, text in extractor.iter_divisions(extractor._xml_source(), path)]
+
+    results = [bench_backend(backend, xml, path, division_texts, args.repeat) for backend in args.backends]
+    for result in results:
+        print({key: value for key, value in result.items() if key != "counts"})
+    if any(result["counts"] != results[0]["counts"] for result in results[1:]):
+        raise SystemExit("Backends disagree on the word counts")
+    print("All backends produced identical counts.")
+
+
+if __name__ == "__main__":
+    main()
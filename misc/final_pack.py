@@ -6,6 +6,7 @@ from collections import defaultdict
 from typing import List, Dict
 from db.db import get_db
 from data_parser.job_queue import DataProcessor
+from data_parser.transformation_store import load_word_transformation_map
 
 
 async def fetch_word_statistics(title_agency_map, title_name_map):
@@ -35,8 +36,7 @@ async def fetch_word_statistics(title_agency_map, title_name_map):
                 print("No data found in version_word_counts table.")
                 return year_agency_word_counts
 
-            with open('word_transformation_map.json', 'r') as f:
-                word_transformation_map = json.load(f)
+            word_transformation_map = await load_word_transformation_map(session)
 
             for row in rows:
                 title_number, version_date, type, code, word_statistics = row
@@ -7,6 +7,7 @@ from datetime import datetime
 from typing import List, Dict
 from db.db import get_db 
 from data_parser.job_queue import DataProcessor
+from data_parser.transformation_store import load_word_transformation_map
 from collections import defaultdict
 
 
@@ -30,8 +31,7 @@ async def fetch_word_statistics(title_agency_map, title_name_map):
             if not rows:
                 print("No data found within the specified timestamp range.")
                 return []
-            with open('word_transformation_map.json', 'r') as f:
-                word_transformation_map = json.load(f)
+            word_transformation_map = await load_word_transformation_map(session)
             for row in rows:
                 title_number, version_date, type, code, word_statistics = row
                 title = title_number
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey
+from sqlalchemy import Column, BigInteger, Integer, String, Boolean, Date, DateTime, Float, ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.sql import func
 from db.db import Base
 from sqlalchemy.dialects.postgresql import JSONB, UUID
@@ -46,6 +46,10 @@ class TitleVersion(Base):
     type = Column(String(100))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        UniqueConstraint('title_number', 'version_date', 'identifier', name='unique_title_version_identifier'),
+    )
+
 
 class AgencyTitleMapping(Base):
     __tablename__ = 'agency_title_mappings'
@@ -62,18 +66,37 @@ class VersionProcessingJobs(Base):
     id = Column(Integer, primary_key=True)
     title_number = Column(Integer, ForeignKey('titles.number'))
     version_date = Column(Date, nullable=False)
-    status = Column(String(20), default='PENDING')
-    attempt_count = Column(Integer, default=0)
+    status = Column(String(20), default='PENDING')  # PENDING, PROCESSING, COMPLETED or DEAD (failed for good)
+    attempt_count = Column(Integer, default=0)  # Finished attempts: completed, failed or lost with an expired lease
     last_attempt_at = Column(DateTime)
-    error_message = Column(String(500))
+    error_message = Column(String(500))  # Last error; kept on retries and on DEAD jobs
+    next_attempt_at = Column(DateTime)  # A PENDING job being retried is not claimed before this
     lock_id = Column(UUID(as_uuid=True), default=uuid.uuid4)
-    lock_acquired_at = Column(DateTime)
+    lock_acquired_at = Column(DateTime)  # Lease start, renewed by the holder's heartbeat; expired leases are reaped
+    division_cache_hit_rate = Column(Float)  # Share of divisions whose counts were reused from an earlier version
+    payload_bytes = Column(BigInteger)  # Size of the title's XML, known from an earlier download
+    size_class = Column(String(10))  # 'small', 'medium' or 'large' from payload_bytes; NULL until the title is sized
+    priority = Column(Integer, default=0)  # Higher priorities are claimed first
+    expected_duration_sec = Column(Float)  # The title's processing time when the job was enqueued; claims go longest first
+    duration_sec = Column(Float)  # How long this job took to process
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
-    # __table_args__ = (
-    #     UniqueConstraint('title_number', 'version_date', name='unique_processing_task'),
-    # )
+    __table_args__ = (
+        UniqueConstraint('title_number', 'version_date', name='unique_processing_task'),
+        # Only pending jobs are indexed, so claiming stays fast however many finished jobs pile up
+        Index('idx_version_processing_jobs_pending', priority.desc(), expected_duration_sec.desc(), 'title_number', 'version_date',
+              postgresql_where=text("status = 'PENDING'")),
+        Index('idx_version_processing_jobs_leases', 'lock_acquired_at', postgresql_where=text("status = 'PROCESSING'")),
+    )
+
+class TitleProcessingStats(Base):
+    __tablename__ = 'title_processing_stats'
+
+    title_number = Column(Integer, primary_key=True)
+    payload_bytes = Column(BigInteger)  # Size of the title's XML as of its latest full run
+    duration_sec = Column(Float)  # Processing time of the title's latest full run
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
 class VersionWordCounts(Base):
     __tablename__ = 'version_word_counts'
@@ -86,3 +109,45 @@ class VersionWordCounts(Base):
     word_statistics = Column(JSONB)
     created_at = Column(DateTime, default=func.now())
     version_date = Column(Date, nullable=False)
+
+class VersionPartWordCounts(Base):
+    __tablename__ = 'version_part_word_counts'
+
+    id = Column(Integer, primary_key=True)
+    title_number = Column(Integer, nullable=False)
+    part = Column(String(100), nullable=False)
+    version_date = Column(Date, nullable=False)  # Version at which the part's counts were (re)computed
+    ancestry = Column(JSONB)  # [[type, N], ...] of the enclosing divisions, ending with the part itself
+    word_statistics = Column(JSONB)
+    removed = Column(Boolean, default=False)  # Part no longer present as of version_date
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('title_number', 'part', 'version_date', name='unique_version_part_word_counts'),
+    )
+
+class VersionDivisionWordCounts(Base):
+    __tablename__ = 'version_division_word_counts'
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey('version_processing_jobs.id'))
+    title_number = Column(Integer, nullable=False)
+    version_date = Column(Date, nullable=False)
+    division_path = Column(String, nullable=False)  # 'type:N/type:N/...' from the outermost division down
+    type = Column(String(100))
+    code = Column(String(100))
+    ancestry = Column(JSONB)  # [[type, N], ...] of the enclosing divisions, ending with the division itself
+    word_statistics = Column(JSONB)  # Words in the division's own text, not inside a deeper counted division
+    content_digest = Column(String(32))  # division_digest() of the own text; lets later versions reuse the counts
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('title_number', 'version_date', 'division_path', name='unique_version_division_word_counts'),
+    )
+
+class WordTransformation(Base):
+    __tablename__ = 'word_transformations'
+
+    word = Column(String, primary_key=True)  # Normalized (lowercased, unpunctuated or stemmed) form
+    original = Column(String, primary_key=True)  # A form it was derived from
+    created_at = Column(DateTime, default=func.now())